@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core import signing
+
+ANONYMOUS_CART_COOKIE = 'cart'
+ANONYMOUS_CART_SALT = 'apps.cart.identity'
+ANONYMOUS_CART_MAX_AGE = 60 * 60 * 24 * 30
+
+
+def anonymous_cart_id(request):
+    """Primary key of the visitor's anonymous cart, from the signed cookie"""
+    if hasattr(request, '_anonymous_cart_id'):
+        return request._anonymous_cart_id
+    value = request.COOKIES.get(ANONYMOUS_CART_COOKIE)
+    cart_id = None
+    if value:
+        try:
+            cart_id = int(signing.loads(value, salt=ANONYMOUS_CART_SALT, max_age=ANONYMOUS_CART_MAX_AGE))
+        except (signing.BadSignature, TypeError, ValueError):
+            pass
+    request._anonymous_cart_id = cart_id
+    return cart_id
+
+
+def remember_anonymous_cart(request, cart):
+    request._anonymous_cart_id = cart.pk
+    request._anonymous_cart_changed = True
+
+
+def forget_anonymous_cart(request):
+    request._anonymous_cart_id = None
+    request._anonymous_cart_changed = True
+
+
+def cart_lookup(request):
+    """Cart filter kwargs for the visitor, or None when they cannot have a cart.
+
+    Anonymous carts live in a signed cookie; carts of older sessions are
+    still found by session key.
+    """
+    if request.user.is_authenticated:
+        return {'user': request.user}
+    cart_id = anonymous_cart_id(request)
+    if cart_id:
+        return {'pk': cart_id, 'user': None}
+    session_key = request.session.session_key
+    if session_key:
+        return {'session_id': session_key, 'user': None}
+    return None
+
+
+def write_anonymous_cart(response, request):
+    """Set or delete the anonymous cart cookie after remember/forget"""
+    if not getattr(request, '_anonymous_cart_changed', False):
+        return
+    cart_id = request._anonymous_cart_id
+    if cart_id is None:
+        response.delete_cookie(ANONYMOUS_CART_COOKIE, samesite='Lax')
+        return
+    response.set_cookie(
+        ANONYMOUS_CART_COOKIE,
+        signing.dumps(cart_id, salt=ANONYMOUS_CART_SALT),
+        max_age=ANONYMOUS_CART_MAX_AGE,
+        secure=settings.SESSION_COOKIE_SECURE,
+        httponly=True,
+        samesite='Lax',
+    )
@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from apps.cart.sweep import SWEEP_BATCH_SIZE, sweep_carts
+
+
+class Command(BaseCommand):
+    help = 'Delete abandoned anonymous carts and expired sessions in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=SWEEP_BATCH_SIZE, help='Rows deleted per transaction')
+        parser.add_argument('--min-age-hours', type=int, default=24, help='Keep session carts younger than this')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between batches')
+        parser.add_argument('--keep-sessions', action='store_true', help='Do not delete expired sessions')
+
+    def handle(self, *args, **options):
+        def progress(result):
+            self.stdout.write(f'  {result.summary()}')
+
+        result = sweep_carts(
+            batch_size=options['batch_size'],
+            min_age=timedelta(hours=options['min_age_hours']),
+            sessions=not options['keep_sessions'],
+            pause=options['pause'],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(result.summary()))
@@ -0,0 +1,22 @@
+from .identity import write_anonymous_cart
+from .summary import write_cart_summary
+
+
+class CartSummaryMiddleware:
+    """Writes the anonymous cart cookie, and the cart summary cookie when the
+    request had to recompute it.
+
+    Must come before the page cache middleware, so cached pages never
+    carry the cookie.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        write_anonymous_cart(response, request)
+        site = getattr(request, '_site_context', None)
+        if site is not None and site.cart_summary_changed:
+            write_cart_summary(response, request, site.cart_summary)
+        return response
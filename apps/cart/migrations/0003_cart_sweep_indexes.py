@@ -0,0 +1,47 @@
+# Generated by Django 5.2.3 on 2026-10-17 02:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+SWEEP_INDEXES = [
+    models.Index(fields=['session_id'], name='cart_session_idx'),
+    models.Index(condition=models.Q(('user__isnull', True)), fields=['created_at'], name='cart_anonymous_created_idx'),
+]
+
+
+def add_indexes(apps, schema_editor):
+    # The cart table can be large: build without blocking writes on Postgres
+    Cart = apps.get_model('cart', 'Cart')
+    for index in SWEEP_INDEXES:
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(index.create_sql(Cart, schema_editor, concurrently=True))
+        else:
+            schema_editor.add_index(Cart, index)
+
+
+def remove_indexes(apps, schema_editor):
+    Cart = apps.get_model('cart', 'Cart')
+    for index in SWEEP_INDEXES:
+        schema_editor.remove_index(Cart, index)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('cart', '0002_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name='cart', index=index) for index in SWEEP_INDEXES
+            ],
+            database_operations=[
+                migrations.RunPython(add_indexes, remove_indexes),
+            ],
+        ),
+    ]
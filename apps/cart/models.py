@@ -1,6 +1,8 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
 from apps.product.models import Product, Size, Color
+from .pricing import CartSnapshot
+from .summary import bump_cart_version
 
 
 
@@ -9,20 +11,36 @@ class Cart(models.Model):
     session_id = models.CharField(max_length=40, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['session_id'], name='cart_session_idx'),
+            # Anonymous carts by age, for the abandoned cart sweep
+            models.Index(fields=['created_at'], condition=models.Q(user__isnull=True), name='cart_anonymous_created_idx'),
+        ]
+
     def __str__(self):
         return f"Cart - {self.user.username if self.user else self.session_id}"
 
+    def get_snapshot(self):
+        """Priced items and totals, loaded once and reused until the cart changes"""
+        snapshot = getattr(self, '_snapshot', None)
+        if snapshot is None:
+            snapshot = self._snapshot = CartSnapshot(self.items.all())
+        return snapshot
+
     def get_total_items(self):
         """Get total number of items in cart"""
-        return sum(item.quantity for item in self.items.all())
+        return self.get_snapshot().total_items
 
     def get_total_price(self):
         """Calculate total price of all items in cart"""
-        return sum(item.get_total_price() for item in self.items.all())
+        return self.get_snapshot().subtotal
 
     def clear_cart(self):
         """Remove all items from cart"""
         self.items.all().delete()
+        self._snapshot = None
+        bump_cart_version(self)
 
     def add_item(self, product, quantity=1, size=None, color=None):
         """Add item to cart or update quantity if exists"""
@@ -37,9 +55,46 @@ class Cart(models.Model):
         if not created:
             cart_item.quantity += quantity
             cart_item.save()
-        
+
+        self._snapshot = None
+        bump_cart_version(self)
         return cart_item
 
+    def merge_into_user_cart(self, user):
+        """Move this anonymous cart's items into the user's cart in bulk.
+
+        Lines for the same product, size and color are added together. Returns
+        the user's cart.
+        """
+        with transaction.atomic():
+            target = Cart.objects.select_for_update().filter(user=user).first()
+            if target is None:
+                self.user = user
+                self.session_id = None
+                self.save(update_fields=['user', 'session_id'])
+                bump_cart_version(self)
+                return self
+
+            existing = {
+                (item.product_id, item.size_id, item.color_id): item
+                for item in target.items.all()
+            }
+            to_update = []
+            to_move = []
+            for item in self.items.all():
+                match = existing.get((item.product_id, item.size_id, item.color_id))
+                if match is None:
+                    to_move.append(item.pk)
+                else:
+                    match.quantity += item.quantity
+                    to_update.append(match)
+            CartItem.objects.bulk_update(to_update, ['quantity'])
+            CartItem.objects.filter(pk__in=to_move).update(cart=target)
+            self.delete()
+        target._snapshot = None
+        bump_cart_version(target)
+        return target
+
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
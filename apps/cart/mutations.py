@@ -0,0 +1,128 @@
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Subquery
+from django.db.models.lookups import GreaterThanOrEqual, LessThanOrEqual
+
+from apps.product.models import Color, Product, Size
+
+from .models import Cart, CartItem
+from .summary import bump_cart_version
+
+
+class CartError(Exception):
+    pass
+
+
+def _stock():
+    """Current stock of the cart item's product, evaluated inside the UPDATE"""
+    return Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('stock_quantity')[:1])
+
+
+def _pk(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def resolve_line(product_id, size_id=None, color_id=None):
+    """Active product plus its selected size and color, checked against the product's variants"""
+    product = (
+        Product.objects.filter(pk=_pk(product_id), is_active=True)
+        .annotate(
+            has_sizes=Exists(Size.objects.filter(product=OuterRef('pk'))),
+            has_colors=Exists(Color.objects.filter(product=OuterRef('pk'))),
+        )
+        .first()
+    )
+    if product is None:
+        raise CartError('Product not found.')
+
+    size = color = None
+    if product.has_sizes:
+        if not size_id:
+            raise CartError('Please select a size.')
+        size = Size.objects.filter(pk=_pk(size_id), product=product).first()
+        if size is None:
+            raise CartError('Size not found.')
+    if product.has_colors:
+        if not color_id:
+            raise CartError('Please select a color.')
+        color = Color.objects.filter(pk=_pk(color_id), product=product).first()
+        if color is None:
+            raise CartError('Color not found.')
+    return product, size, color
+
+
+def _increment_line(cart, product, quantity, size, color):
+    return (
+        CartItem.objects.filter(cart=cart, product=product, size=size, color=color)
+        .filter(LessThanOrEqual(F('quantity') + quantity, _stock()))
+        .update(quantity=F('quantity') + quantity)
+    )
+
+
+def add_item(cart, product, quantity, size=None, color=None):
+    """Add quantity to the cart line, creating it if needed. Returns True when created.
+
+    Existing lines grow with one conditional UPDATE that also checks stock, so
+    concurrent adds can neither lose updates nor overshoot stock.
+    """
+    if quantity < 1:
+        raise CartError('Quantity must be at least 1.')
+    if _increment_line(cart, product, quantity, size, color):
+        bump_cart_version(cart)
+        return False
+
+    with transaction.atomic():
+        # Serialize line creation per cart, then retry: another request may have created it
+        Cart.objects.select_for_update().only('pk').get(pk=cart.pk)
+        if _increment_line(cart, product, quantity, size, color):
+            bump_cart_version(cart)
+            return False
+        if CartItem.objects.filter(cart=cart, product=product, size=size, color=color).exists():
+            raise CartError(f'Sorry, {product.name} is out of stock or has insufficient quantity.')
+        if not Product.objects.filter(pk=product.pk, is_active=True, stock_quantity__gte=quantity).exists():
+            raise CartError(f'Sorry, {product.name} is out of stock or has insufficient quantity.')
+        CartItem.objects.create(cart=cart, product=product, quantity=quantity, size=size, color=color)
+    bump_cart_version(cart)
+    return True
+
+
+def _changed(cart, updated):
+    """Bump the cart's version when a mutation touched a row"""
+    if updated:
+        bump_cart_version(cart)
+    return bool(updated)
+
+
+def change_quantity(cart, item_id, delta):
+    """Add delta to a line's quantity, keeping it at least 1 and, when growing, within stock.
+
+    Decreases skip the stock check so a line left above a lowered stock can
+    still be reduced.
+    """
+    items = CartItem.objects.filter(pk=_pk(item_id), cart=cart, quantity__gte=1 - delta)
+    if delta > 0:
+        items = items.filter(LessThanOrEqual(F('quantity') + delta, _stock()))
+    return _changed(cart, items.update(quantity=F('quantity') + delta))
+
+
+def set_quantity(cart, item_id, quantity):
+    """Set a line's quantity if the product has enough stock"""
+    if quantity < 1:
+        raise CartError('Quantity must be at least 1.')
+    return _changed(cart, (
+        CartItem.objects.filter(pk=_pk(item_id), cart=cart)
+        .filter(GreaterThanOrEqual(_stock(), quantity))
+        .update(quantity=quantity)
+    ))
+
+
+def get_item(cart, item_id):
+    """The cart's line with its product, or None"""
+    return CartItem.objects.select_related('product').filter(pk=_pk(item_id), cart=cart).first()
+
+
+def remove_item(cart, item_id):
+    deleted, _ = CartItem.objects.filter(pk=_pk(item_id), cart=cart).delete()
+    return _changed(cart, deleted)
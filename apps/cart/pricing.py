@@ -0,0 +1,35 @@
+from decimal import Decimal
+
+from django.db.models import DecimalField, ExpressionWrapper, F
+
+LINE_TOTAL = ExpressionWrapper(
+    F('quantity') * F('product__price'),
+    output_field=DecimalField(max_digits=12, decimal_places=2),
+)
+
+
+def priced_items(queryset):
+    """Cart items with product, size and color joined and a line_total annotation"""
+    return (
+        queryset.select_related('product', 'size', 'color')
+        .annotate(line_total=LINE_TOTAL)
+        .order_by('id')
+    )
+
+
+class CartSnapshot:
+    """Cart items, per-line totals, item count and subtotal read in one query"""
+
+    def __init__(self, queryset):
+        self.items = list(priced_items(queryset))
+        self.total_items = sum(item.quantity for item in self.items)
+        self.subtotal = sum((item.line_total for item in self.items), Decimal('0.00'))
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
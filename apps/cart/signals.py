@@ -0,0 +1,19 @@
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+
+from .identity import anonymous_cart_id, forget_anonymous_cart
+from .models import Cart
+
+
+@receiver(user_logged_in)
+def merge_anonymous_cart(sender, request, user, **kwargs):
+    """Carry the visitor's anonymous cart over to their account"""
+    if request is None:
+        return
+    cart_id = anonymous_cart_id(request)
+    if not cart_id:
+        return
+    cart = Cart.objects.filter(pk=cart_id, user=None).first()
+    if cart is not None:
+        cart.merge_into_user_cart(user)
+    forget_anonymous_cart(request)
@@ -0,0 +1,115 @@
+import hashlib
+from decimal import Decimal
+from functools import wraps
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+
+from apps.product.cache import get_product_versions, get_version, new_version
+
+from .identity import anonymous_cart_id
+
+CART_SUMMARY_COOKIE = 'cart_summary'
+CART_SUMMARY_SALT = 'apps.cart.summary'
+# Bump when the payload layout changes so old cookies are ignored
+CART_SUMMARY_VERSION = 2
+CART_SUMMARY_MAX_AGE = 60 * 60 * 24 * 14
+
+
+def cart_owner(request):
+    """Who the summary belongs to, so a cookie never outlives a login or a new cart"""
+    if request.user.is_authenticated:
+        return f'u{request.user.pk}'
+    cart_id = anonymous_cart_id(request)
+    if cart_id:
+        return f'c{cart_id}'
+    return f's{request.session.session_key or ""}'
+
+
+def _cart_version_key(owner):
+    return f'cart:version:{owner}'
+
+
+def cart_owners(cart):
+    """Owners whose summary cookie may describe this cart"""
+    if cart.user_id:
+        return [f'u{cart.user_id}']
+    owners = [f'c{cart.pk}']
+    if cart.session_id:
+        owners.append(f's{cart.session_id}')
+    return owners
+
+
+def bump_cart_version(cart):
+    """Make the summary cookies of the cart's owners stale after its items changed"""
+    cache.set_many({_cart_version_key(owner): new_version() for owner in cart_owners(cart)}, None)
+
+
+def _prices_version(product_ids):
+    """Digest of the versions of the cart's products, which change with their prices"""
+    versions = get_product_versions(product_ids)
+    return hashlib.md5('.'.join(versions[pk] for pk in product_ids).encode()).hexdigest()[:12]
+
+
+def read_cart_summary(request):
+    """Item count and subtotal from the signed cookie, or None when missing or stale.
+
+    The payload carries the cart's own version, bumped by cart mutations, and
+    the versions of its products, so only edits to this cart or to the
+    products in it make the summary stale.
+    """
+    value = request.COOKIES.get(CART_SUMMARY_COOKIE)
+    if not value:
+        return None
+    try:
+        payload = signing.loads(value, salt=CART_SUMMARY_SALT, max_age=CART_SUMMARY_MAX_AGE)
+        owner = cart_owner(request)
+        if (
+            payload['v'] != CART_SUMMARY_VERSION
+            or payload['o'] != owner
+            or payload['c'] != get_version(_cart_version_key(owner))
+            or payload['p'] != _prices_version(payload['i'])
+        ):
+            return None
+        return {
+            'total_items': int(payload['n']),
+            'total_price': Decimal(payload['s']),
+            'product_ids': payload['i'],
+        }
+    except (signing.BadSignature, KeyError, TypeError, ValueError, ArithmeticError):
+        return None
+
+
+def write_cart_summary(response, request, summary):
+    owner = cart_owner(request)
+    product_ids = summary.get('product_ids', [])
+    value = signing.dumps({
+        'v': CART_SUMMARY_VERSION,
+        'o': owner,
+        'c': get_version(_cart_version_key(owner)),
+        'i': product_ids,
+        'p': _prices_version(product_ids),
+        'n': summary['total_items'],
+        's': str(summary['total_price']),
+    }, salt=CART_SUMMARY_SALT)
+    response.set_cookie(
+        CART_SUMMARY_COOKIE, value,
+        max_age=CART_SUMMARY_MAX_AGE,
+        secure=settings.SESSION_COOKIE_SECURE,
+        httponly=True,
+        samesite='Lax',
+    )
+
+
+def updates_cart_summary(view):
+    """Rewrite the summary cookie after a view that changes the cart"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        from main.context_processors import get_site_context
+
+        response = view(request, *args, **kwargs)
+        if request.method == 'POST':
+            get_site_context(request).refresh_cart_summary()
+        return response
+    return wrapper
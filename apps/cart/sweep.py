@@ -0,0 +1,106 @@
+import time
+from datetime import timedelta
+
+from django.contrib.sessions.models import Session
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .identity import ANONYMOUS_CART_MAX_AGE
+from .models import Cart, CartItem
+
+SWEEP_BATCH_SIZE = 1000
+# Session carts younger than this are left alone even without a live session
+SWEEP_MIN_AGE = timedelta(days=1)
+
+
+class SweepResult:
+    def __init__(self):
+        self.carts = 0
+        self.items = 0
+        self.sessions = 0
+        self.started = time.monotonic()
+
+    @property
+    def rows(self):
+        return self.carts + self.items + self.sessions
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0
+
+    def summary(self):
+        return (
+            f'Deleted {self.carts} carts, {self.items} cart items and {self.sessions} sessions '
+            f'in {self.elapsed:.2f}s ({self.rows_per_second:.0f} rows/s)'
+        )
+
+
+def abandoned_carts(now=None, min_age=SWEEP_MIN_AGE):
+    """Anonymous carts nobody can reach any more.
+
+    Cookie carts are unreachable once their cookie has expired; session
+    carts once their session has expired or been deleted.
+    """
+    now = now or timezone.now()
+    live_session = Session.objects.filter(session_key=OuterRef('session_id'), expire_date__gt=now)
+    cookie_carts = Cart.objects.filter(
+        user__isnull=True,
+        session_id__isnull=True,
+        created_at__lt=now - timedelta(seconds=ANONYMOUS_CART_MAX_AGE),
+    )
+    session_carts = Cart.objects.filter(
+        user__isnull=True,
+        session_id__isnull=False,
+        created_at__lt=now - min_age,
+    ).filter(~Exists(live_session))
+    return cookie_carts, session_carts
+
+
+def _delete_carts(queryset, result, batch_size, pause):
+    last_pk = 0
+    while True:
+        ids = list(
+            queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return
+        # Short transaction per batch, so locks are held only for one batch
+        with transaction.atomic():
+            _, deleted = Cart.objects.filter(pk__in=ids).delete()
+        result.carts += deleted.get(Cart._meta.label, 0)
+        result.items += deleted.get(CartItem._meta.label, 0)
+        last_pk = ids[-1]
+        if pause:
+            time.sleep(pause)
+
+
+def _delete_expired_sessions(now, result, batch_size, pause):
+    while True:
+        keys = list(
+            Session.objects.filter(expire_date__lt=now).values_list('session_key', flat=True)[:batch_size]
+        )
+        if not keys:
+            return
+        result.sessions += Session.objects.filter(session_key__in=keys).delete()[0]
+        if pause:
+            time.sleep(pause)
+
+
+def sweep_carts(batch_size=SWEEP_BATCH_SIZE, min_age=SWEEP_MIN_AGE, sessions=True, pause=0, progress=None):
+    """Delete abandoned anonymous carts, their items and expired sessions in bounded batches"""
+    result = SweepResult()
+    now = timezone.now()
+    for queryset in abandoned_carts(now, min_age):
+        _delete_carts(queryset, result, batch_size, pause)
+        if progress:
+            progress(result)
+    if sessions:
+        _delete_expired_sessions(now, result, batch_size, pause)
+        if progress:
+            progress(result)
+    return result
@@ -1,3 +1,243 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.signals import user_logged_in
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from apps.product.models import Product, Size
+from main.config import get_config
+from main.models import User
+
+from .identity import ANONYMOUS_CART_COOKIE
+from .models import Cart, CartItem
+from .mutations import CartError, add_item, change_quantity, set_quantity
+from .summary import CART_SUMMARY_COOKIE
+
+
+class CartSnapshotTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.shirt = Product.objects.create(name='Shirt', price='25.50', sku='SHIRT-1', stock_quantity=9)
+        self.socks = Product.objects.create(name='Socks', price='4.00', sku='SOCKS-1', stock_quantity=9)
+        self.size = Size.objects.create(product=self.shirt, name='M')
+
+    def fill(self, cart):
+        CartItem.objects.create(cart=cart, product=self.shirt, size=self.size, quantity=2)
+        CartItem.objects.create(cart=cart, product=self.socks, quantity=3)
+
+    def test_snapshot_is_one_query(self):
+        cart = Cart.objects.create(session_id='abc')
+        self.fill(cart)
+        with self.assertNumQueries(1):
+            snapshot = cart.get_snapshot()
+            self.assertEqual(snapshot.total_items, 5)
+            self.assertEqual(snapshot.subtotal, Decimal('63.00'))
+            self.assertEqual([item.line_total for item in snapshot], [Decimal('51.00'), Decimal('12.00')])
+            self.assertEqual(snapshot.items[0].size.name, 'M')
+            self.assertEqual(cart.get_total_price(), snapshot.subtotal)
+
+    def test_cart_page_reuses_snapshot(self):
+        session = self.client.session
+        session.save()
+        self.fill(Cart.objects.create(session_id=session.session_key))
+        get_config()
+        # session, cart, priced items; the header badge reuses the snapshot
+        with self.assertNumQueries(3):
+            response = self.client.get('/cart/', secure=True)
+        self.assertContains(response, 'cartCount: 5')
+        self.assertEqual(response.context['total_price'], Decimal('63.00'))
+
+
+class CartSummaryCookieTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        get_config()
+        self.product = Product.objects.create(name='Hat', price='12.00', sku='HAT-1', stock_quantity=9)
+
+    def add(self, quantity):
+        return self.client.post(
+            '/cart/add/', {'product_id': self.product.pk, 'quantity': quantity, 'size': '', 'color': ''},
+            secure=True,
+        )
+
+    def test_mutations_rewrite_the_cookie(self):
+        self.add(2)
+        self.add(1)
+        self.assertIn(CART_SUMMARY_COOKIE, self.client.cookies)
+        response = self.client.get('/contact/', secure=True)
+        self.assertContains(response, 'cartCount: 3')
+
+    def test_header_reads_cookie_without_cart_queries(self):
+        self.add(2)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/contact/', secure=True)
+        self.assertContains(response, 'cartCount: 2')
+        self.assertFalse([q for q in queries if 'cart_' in q['sql']])
+
+    def test_price_change_invalidates_cookie(self):
+        self.add(2)
+        self.product.price = Decimal('15.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        response = self.client.get('/contact/', secure=True)
+        self.assertEqual(response.context['site'].cart_summary['total_price'], Decimal('30.00'))
+
+    def test_unrelated_catalogue_changes_keep_the_cookie(self):
+        self.add(2)
+        Product.objects.create(name='Scarf', price='9.00', sku='SCARF-1', stock_quantity=3)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/contact/', secure=True)
+        self.assertContains(response, 'cartCount: 2')
+        self.assertFalse([q for q in queries if 'cart_' in q['sql']])
+
+    def test_changes_outside_the_request_make_the_cookie_stale(self):
+        self.add(2)
+        cart = Cart.objects.get()
+        change_quantity(cart, cart.items.get().pk, 1)
+        self.assertContains(self.client.get('/contact/', secure=True), 'cartCount: 3')
+        cart.clear_cart()
+        self.assertContains(self.client.get('/contact/', secure=True), 'cartCount: 0')
+
+
+class AnonymousCartTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        get_config()
+        self.hat = Product.objects.create(name='Hat', price='12.00', sku='HAT-2', stock_quantity=9)
+        self.scarf = Product.objects.create(name='Scarf', price='20.00', sku='SCARF-1', stock_quantity=9)
+
+    def add(self, product, quantity=1):
+        return self.client.post(
+            '/cart/add/', {'product_id': product.pk, 'quantity': quantity, 'size': '', 'color': ''},
+            secure=True,
+        )
+
+    def test_empty_cart_pages_do_not_write(self):
+        for url in ('/cart/', '/checkout/checkout/'):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url, secure=True)
+            writes = [q['sql'] for q in queries if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+            self.assertEqual(writes, [])
+        self.assertFalse(Cart.objects.exists())
+        self.assertNotIn('sessionid', self.client.cookies)
+
+    def test_first_add_persists_cart_in_cookie(self):
+        self.add(self.hat, 2)
+        self.add(self.hat, 1)
+        self.assertIn(ANONYMOUS_CART_COOKIE, self.client.cookies)
+        cart = Cart.objects.get()
+        self.assertIsNone(cart.session_id)
+        self.assertEqual(cart.get_total_items(), 3)
+        self.assertContains(self.client.get('/cart/', secure=True), 'Hat')
+
+    def test_login_merges_into_user_cart(self):
+        user = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+        user_cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=user_cart, product=self.hat, quantity=1)
+        self.add(self.hat, 2)
+        self.add(self.scarf, 1)
+
+        request = RequestFactory().get('/')
+        request.COOKIES[ANONYMOUS_CART_COOKIE] = self.client.cookies[ANONYMOUS_CART_COOKIE].value
+        user_logged_in.send(sender=User, request=request, user=user)
+
+        self.assertEqual(Cart.objects.count(), 1)
+        quantities = dict(user_cart.items.values_list('product__sku', 'quantity'))
+        self.assertEqual(quantities, {'HAT-2': 3, 'SCARF-1': 1})
+        self.assertIsNone(request._anonymous_cart_id)
+
+    def test_login_adopts_cart_when_user_has_none(self):
+        user = User.objects.create_user('newbie', 'newbie@example.com', 'pw')
+        self.add(self.scarf, 2)
+        request = RequestFactory().get('/')
+        request.COOKIES[ANONYMOUS_CART_COOKIE] = self.client.cookies[ANONYMOUS_CART_COOKIE].value
+        user_logged_in.send(sender=User, request=request, user=user)
+        self.assertEqual(Cart.objects.get().user, user)
+
+
+class CartMutationTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(name='Mittens', price='6.00', sku='MITT-1', stock_quantity=5)
+        self.cart = Cart.objects.create(session_id='mutations')
+
+    def test_increment_is_one_conditional_update(self):
+        add_item(self.cart, self.product, 2)
+        with self.assertNumQueries(1):
+            self.assertFalse(add_item(self.cart, self.product, 3))
+        self.assertEqual(self.cart.items.get().quantity, 5)
+
+    def test_stock_is_never_exceeded(self):
+        add_item(self.cart, self.product, 4)
+        item = self.cart.items.get()
+        with self.assertRaises(CartError):
+            add_item(self.cart, self.product, 2)
+        self.assertTrue(change_quantity(self.cart, item.pk, 1))
+        self.assertFalse(change_quantity(self.cart, item.pk, 1))
+        self.assertFalse(set_quantity(self.cart, item.pk, 6))
+        self.assertTrue(set_quantity(self.cart, item.pk, 1))
+        self.assertFalse(change_quantity(self.cart, item.pk, -1))
+        self.assertEqual(CartItem.objects.get().quantity, 1)
+
+    def test_decrease_below_lowered_stock(self):
+        add_item(self.cart, self.product, 5)
+        item = self.cart.items.get()
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=2)
+        self.assertTrue(change_quantity(self.cart, item.pk, -1))
+        self.assertFalse(change_quantity(self.cart, item.pk, 1))
+        self.assertEqual(CartItem.objects.get().quantity, 4)
+
+    def test_batch_endpoint(self):
+        other = Product.objects.create(name='Boots', price='30.00', sku='BOOT-1', stock_quantity=2)
+        response = self.client.post('/cart/batch/', {'operations': [
+            {'op': 'add', 'product_id': self.product.pk, 'quantity': 2},
+            {'op': 'add', 'product_id': other.pk, 'quantity': 1},
+        ]}, content_type='application/json', secure=True)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['total_items'], data['subtotal']), (3, '42.00'))
+
+        boots = next(item for item in data['items'] if item['product_id'] == other.pk)
+        response = self.client.post('/cart/batch/', {'operations': [
+            {'op': 'remove', 'item_id': boots['id']},
+            {'op': 'set', 'item_id': data['items'][0]['id'], 'quantity': 99},
+        ]}, content_type='application/json', secure=True)
+        # The failing set rolls back the remove as well
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(CartItem.objects.filter(product=other).count(), 1)
+
+
+class CartSweepTest(TestCase):
+
+    def test_sweeps_only_unreachable_carts(self):
+        from datetime import timedelta
+
+        from django.contrib.sessions.backends.db import SessionStore
+        from django.utils import timezone
+
+        from .sweep import sweep_carts
+
+        product = Product.objects.create(name='Toy', price='3.00', sku='TOY-1', stock_quantity=9)
+        live = SessionStore()
+        live.create()
+        old = timezone.now() - timedelta(days=60)
+
+        keep = [
+            Cart.objects.create(session_id=live.session_key),
+            Cart.objects.create(),
+            Cart.objects.create(user=User.objects.create_user('kept', 'kept@example.com', 'pw')),
+        ]
+        drop = [Cart.objects.create(session_id='gone'), Cart.objects.create()]
+        for cart in keep + drop:
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+        Cart.objects.filter(pk__in=[cart.pk for cart in drop] + [keep[2].pk]).update(created_at=old)
+
+        result = sweep_carts(batch_size=1)
+        self.assertEqual((result.carts, result.items), (2, 2))
+        self.assertEqual(set(Cart.objects.values_list('pk', flat=True)), {cart.pk for cart in keep})
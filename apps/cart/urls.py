@@ -9,6 +9,7 @@ urlpatterns = [
     path('remove/', remove_from_cart, name='remove_from_cart'),
     path('increase/', increase_cart_item_quantity, name='increase_cart_item_quantity'),
     path('decrease/', decrease_cart_item_quantity, name='decrease_cart_item_quantity'),
+    path('batch/', cart_batch, name='cart_batch'),
 ]
 
 if settings.DEBUG:
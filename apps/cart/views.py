@@ -1,150 +1,193 @@
-from django.shortcuts import render, get_object_or_404, redirect
+import json
+
+from django.db import transaction
+from django.shortcuts import render, redirect
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from django.contrib import messages
+from .identity import cart_lookup, remember_anonymous_cart
 from .models import Cart, CartItem
-from apps.product.models import Product, Size, Color
+from .mutations import (
+    CartError, add_item, change_quantity, get_item, remove_item, resolve_line, set_quantity,
+)
+from .pricing import CartSnapshot
+from .summary import updates_cart_summary
+from main.context_processors import get_site_context
+
+def get_cart(request):
+    """Existing cart for user/visitor, or None. Never writes to the database"""
+    site = get_site_context(request)
+    lookup = cart_lookup(request)
+    cart = Cart.objects.filter(**lookup).first() if lookup else None
+    # Lets the layout reuse this cart's snapshot instead of querying again
+    site.cart = cart
+    return cart
+
 
 def get_or_create_cart(request):
-    """Helper function to get or create cart for user/session"""
-    if request.user.is_authenticated:
-        cart, created = Cart.objects.get_or_create(
-            user=request.user,
-            defaults={'session_id': None}
-        )
-    else:
-        if not request.session.session_key:
-            request.session.create()
-        cart, created = Cart.objects.get_or_create(
-            session_id=request.session.session_key,
-            user=None
-        )
+    """Helper function to get or create cart for user/session.
+
+    Anonymous carts are only created here, when the first item is added,
+    and are identified by a signed cookie instead of a session.
+    """
+    cart = get_cart(request)
+    if cart is None:
+        if request.user.is_authenticated:
+            cart, created = Cart.objects.get_or_create(
+                user=request.user,
+                defaults={'session_id': None}
+            )
+        else:
+            cart = Cart.objects.create()
+            remember_anonymous_cart(request, cart)
+        get_site_context(request).cart = cart
     return cart
 
 
 def cart_view(request):
     """Display cart contents"""
-    cart = get_or_create_cart(request)
-    cart_items = cart.items.select_related('product', 'size', 'color').all()
-    
+    cart = get_cart(request)
+    snapshot = cart.get_snapshot() if cart else CartSnapshot(CartItem.objects.none())
+
     context = {
         'cart': cart,
-        'cart_items': cart_items,
-        'total_items': cart.get_total_items(),
-        'total_price': cart.get_total_price(),
+        'cart_items': snapshot.items,
+        'total_items': snapshot.total_items,
+        'total_price': snapshot.subtotal,
     }
     return render(request, 'cart/cart.html', context)
 
 @require_POST
+@updates_cart_summary
 def add_to_cart(request):
+    """Add product to cart"""
+    product = None
     try:
-        """Add product to cart"""
-        cart = get_or_create_cart(request)
-        if not cart:
-            messages.error(request, 'Could not create or retrieve cart.')
-            return redirect('product_list')
-        product_id = request.POST.get('product_id')
         quantity = int(request.POST.get('quantity', 1))
-        size_id = request.POST.get('size')
-        color_id = request.POST.get('color')
-        size = None
-        color = None
-
-        
-        # Get the product and check if it can be ordered
-        product = get_object_or_404(Product, id=product_id, is_active=True)
-        if product.sizes.exists():
-            if not size_id == '':
-                size = get_object_or_404(Size, id=size_id, product=product)
-            else:
-                messages.error(request, 'Please select a size.')
-                return redirect('product_detail', slug=product.slug)
-        if product.colors.exists():
-            if not color_id == '':
-                color = get_object_or_404(Color, id=color_id, product=product)
-            else:
-                messages.error(request, 'Please select a color.')
-                return redirect('product_detail', slug=product.slug)
-
+        product, size, color = resolve_line(
+            request.POST.get('product_id'), request.POST.get('size'), request.POST.get('color')
+        )
         if not product.can_order(quantity):
             messages.error(request, f'Sorry, {product.name} is out of stock or has insufficient quantity.')
             return redirect('product_detail', slug=product.slug)
-        
-        # If the Same product is already in the cart, update the quantity
-        existing_item = cart.items.filter(product=product, size=size, color=color).first()
-        if existing_item:
-            existing_item.quantity += quantity
-            existing_item.save()
+
+        cart = get_or_create_cart(request)
+        created = add_item(cart, product, quantity, size, color)
+        if not created:
             messages.success(request, f'{product.name} quantity updated in cart.')
             return redirect('product_detail', slug=product.slug)
 
-        
-        # Create cart item
-        CartItem.objects.create(
-            cart=cart,
-            product=product,
-            quantity=quantity,
-            size=size,
-            color=color
-        )
         if request.POST.get('next') == 'checkout':
             return redirect('checkout')
 
         messages.success(request, f'{product.name} added to cart.')
         return redirect('product_detail', slug=product.slug)
-    except Exception as e:
+    except (CartError, ValueError) as e:
         messages.error(request, f'Error adding item to cart: {e}')
+        if product is None:
+            return redirect('products')
         return redirect('product_detail', slug=product.slug)
 
 @require_POST
+@updates_cart_summary
 def increase_cart_item_quantity(request):
     """increas quantity by 1"""
-    try:
-        item_id = request.POST.get('item_id')
-        cart = get_or_create_cart(request)
-        cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
-        if cart_item.quantity >= cart_item.product.stock_quantity:
-            messages.warning(request, "Stock limit up")
-            return redirect('cart')
-        cart_item.quantity += 1
-        cart_item.save()
-        return redirect('cart')
-
-    except Exception as e:
-        messages.error(request, f'Error updating item quantity in cart: {e}')
-        return redirect('cart')
+    if not change_quantity(get_cart(request), request.POST.get('item_id'), 1):
+        messages.warning(request, "Stock limit up")
+    return redirect('cart')
     
 @require_POST
+@updates_cart_summary
 def decrease_cart_item_quantity(request):
     """decrease quantity by 1"""
-    try:
-        item_id = request.POST.get('item_id')
-        cart = get_or_create_cart(request)
-        cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
-        if cart_item.quantity == 1:
-            messages.warning(request, "Can't decrease")
-            return redirect('cart')
-        cart_item.quantity -= 1
-        cart_item.save()
-        return redirect('cart')
-
-    except Exception as e:
-        messages.error(request, f'Error updating item quantity in cart: {e}')
-        return redirect('cart')
+    if not change_quantity(get_cart(request), request.POST.get('item_id'), -1):
+        messages.warning(request, "Can't decrease")
+    return redirect('cart')
 
 @require_POST
+@updates_cart_summary
 def remove_from_cart(request):
     """Remove item from cart"""
-    try:
-        item_id = request.POST.get('item_id')
-        cart = get_or_create_cart(request)
-        cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
-        
-        product_name = cart_item.product.name
-        cart_item.delete()
-        messages.success(request, f'{product_name} removed from cart.')
+    cart = get_cart(request)
+    cart_item = get_item(cart, request.POST.get('item_id'))
+    if cart_item is None:
+        messages.error(request, 'Error removing item from cart: item not found.')
         return redirect('cart')
 
-    except Exception as e:
-        messages.error(request, f'Error removing item from cart: {e}')
-        return redirect('cart')
\ No newline at end of file
+    remove_item(cart, cart_item.pk)
+    messages.success(request, f'{cart_item.product.name} removed from cart.')
+    return redirect('cart')
+
+
+def _snapshot_json(snapshot):
+    return {
+        'items': [
+            {
+                'id': item.id,
+                'product_id': item.product_id,
+                'name': item.product.name,
+                'image': item.product.primary_image_url,
+                'size': item.size.name if item.size else None,
+                'color': item.color.name if item.color else None,
+                'quantity': item.quantity,
+                'unit_price': str(item.product.price),
+                'line_total': str(item.line_total),
+            }
+            for item in snapshot
+        ],
+        'total_items': snapshot.total_items,
+        'subtotal': str(snapshot.subtotal),
+    }
+
+
+def _apply_operation(request, cart, operation):
+    """Apply one batch operation, returning the (possibly new) cart"""
+    op = operation.get('op')
+    if op == 'add':
+        quantity = int(operation.get('quantity', 1))
+        product, size, color = resolve_line(
+            operation.get('product_id'), operation.get('size'), operation.get('color')
+        )
+        cart = cart or get_or_create_cart(request)
+        add_item(cart, product, quantity, size, color)
+    elif op == 'set':
+        if not set_quantity(cart, operation.get('item_id'), int(operation.get('quantity', 1))):
+            raise CartError('Item not found or not enough stock.')
+    elif op == 'remove':
+        if not remove_item(cart, operation.get('item_id')):
+            raise CartError('Item not found.')
+    else:
+        raise CartError(f'Unknown operation "{op}".')
+    return cart
+
+
+@require_POST
+@updates_cart_summary
+def cart_batch(request):
+    """Apply a batch of add/set/remove operations in one transaction.
+
+    Expects {"operations": [{"op": "add", "product_id": 1, "quantity": 2,
+    "size": 3, "color": null}, {"op": "set", "item_id": 5, "quantity": 1},
+    {"op": "remove", "item_id": 6}]} and returns the new cart snapshot.
+    Nothing is applied if any operation fails.
+    """
+    try:
+        operations = json.loads(request.body or b'{}').get('operations')
+    except (ValueError, AttributeError):
+        operations = None
+    if not isinstance(operations, list) or not all(isinstance(op, dict) for op in operations):
+        return JsonResponse({'error': 'Expected a JSON object with an "operations" list.'}, status=400)
+
+    cart = get_cart(request)
+    try:
+        with transaction.atomic():
+            for index, operation in enumerate(operations):
+                try:
+                    cart = _apply_operation(request, cart, operation)
+                except (CartError, ValueError, TypeError) as e:
+                    raise CartError(f'Operation {index}: {e}')
+    except CartError as e:
+        return JsonResponse({'error': str(e)}, status=409)
+
+    snapshot = cart.get_snapshot() if cart else CartSnapshot(CartItem.objects.none())
+    return JsonResponse(_snapshot_json(snapshot))
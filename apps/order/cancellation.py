@@ -0,0 +1,69 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+
+from apps.product.cache import stock_changed
+from apps.product.models import Product
+from apps.product.stats import reverse_sales
+
+from .models import CANCELLABLE_STATUSES, Order, OrderItem, OrderStatusEvent
+
+
+def restock(quantities):
+    """Return (product_id -> quantity) to stock in one UPDATE.
+
+    Returns the ids of the products that were out of stock before.
+    """
+    if not quantities:
+        return []
+    # Lock in primary key order, the same order checkout takes stock in,
+    # so a cancellation and a checkout over the same products can't deadlock
+    stock = list(
+        Product.objects.select_for_update().filter(pk__in=quantities)
+        .order_by('pk').values_list('pk', 'stock_quantity')
+    )
+    returned = Case(
+        *[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+    Product.objects.filter(pk__in=quantities).update(stock_quantity=F('stock_quantity') + returned)
+    return [pk for pk, stock_quantity in stock if stock_quantity <= 0]
+
+
+def cancel_orders(orders, user=None):
+    """Cancel the cancellable orders among `orders` and restock their items.
+
+    Returns the number of orders cancelled. The orders are locked before
+    their status changes, so an order cancelled twice at once is restocked
+    only once.
+    """
+    with transaction.atomic():
+        rows = list(
+            Order.objects.select_for_update()
+            .filter(pk__in=orders.values('pk'), status__in=CANCELLABLE_STATUSES)
+            .order_by('pk').values_list('pk', 'status', 'created_at')
+        )
+        if not rows:
+            return 0
+        cancelled = {pk: created_at for pk, _, created_at in rows}
+        Order.objects.filter(pk__in=cancelled).update(status='cancelled')
+        OrderStatusEvent.record([(pk, status) for pk, status, _ in rows], 'cancelled', user=user)
+
+        lines = defaultdict(list)
+        quantities = {}
+        for order_id, product_id, quantity in (
+            OrderItem.objects.filter(order_id__in=cancelled).order_by()
+            .values('order_id', 'product_id').annotate(quantity=Sum('quantity'))
+            .values_list('order_id', 'product_id', 'quantity')
+        ):
+            lines[order_id].append((product_id, quantity))
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+        back_in_stock = restock(quantities)
+
+        # Each order counts once in the rollup and decays from its own date
+        for order_id, order_lines in lines.items():
+            reverse_sales(order_lines, cancelled[order_id])
+
+    stock_changed(quantities, in_stock_changed=bool(back_in_stock))
+    return len(cancelled)
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.3 on 2026-10-17 03:12
+
+import django.core.validators
+from django.db import migrations, models, transaction
+from django.db.models import F, OuterRef, Subquery
+
+BACKFILL_BATCH_SIZE = 2000
+
+
+def backfill_prices(apps, schema_editor):
+    # Existing lines only know the current product price, use it as their snapshot
+    OrderItem = apps.get_model('order', 'OrderItem')
+    Product = apps.get_model('product', 'Product')
+    price = Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('price')[:1])
+    pending = OrderItem.objects.filter(unit_price__isnull=True).order_by('pk')
+
+    last_pk = 0
+    while True:
+        ids = list(pending.filter(pk__gt=last_pk).values_list('pk', flat=True)[:BACKFILL_BATCH_SIZE])
+        if not ids:
+            break
+        # One short transaction per batch; a rerun resumes at the unpriced rows
+        with transaction.atomic(using=schema_editor.connection.alias):
+            OrderItem.objects.filter(pk__in=ids).update(unit_price=price, line_total=F('quantity') * price)
+        last_pk = ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('order', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='line_total',
+            field=models.DecimalField(decimal_places=2, max_digits=12, null=True, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.RunPython(backfill_prices, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='line_total',
+            field=models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+    ]
@@ -1,7 +1,13 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Sum
 from django.core.validators import MinValueValidator
 from main.models import User
+from apps.product.cache import stock_changed
 from apps.product.models import Product, Size, Color
+from apps.product.stats import record_sales
+from .numbers import generate_order_number
+
+CANCELLABLE_STATUSES = ('pending', 'confirmed')
 
 class Address(models.Model):
     name = models.CharField(max_length=100)
@@ -49,77 +55,91 @@ class Order(models.Model):
         super().save(*args, **kwargs)
 
     def generate_order_number(self):
-        """Generate unique order number"""
-        import random
-        while True:
-            order_number = f"ORD-{random.randint(1000000, 9999999)}"
-            if not Order.objects.filter(order_number=order_number).exists():
-                return order_number
+        """Generate unique order number without a lookup query"""
+        return generate_order_number()
 
     def get_total_items(self):
         """Get total number of items in order"""
-        return sum(item.quantity for item in self.items.all())
+        return self.items.aggregate(total=Sum('quantity'))['total'] or 0
 
     def can_cancel(self):
         """Check if order can be cancelled"""
-        return self.status in ['pending', 'confirmed']
+        return self.status in CANCELLABLE_STATUSES
 
-    def cancel_order(self):
+    def cancel_order(self, user=None):
         """Cancel order and restore stock"""
-        if self.can_cancel():
-            # Restore stock for all items
-            for item in self.items.all():
-                item.product.increase_stock(item.quantity)
-            
+        from .cancellation import cancel_orders
+
+        if cancel_orders(Order.objects.filter(pk=self.pk), user=user):
             self.status = 'cancelled'
-            self.save()
             return True
         return False
 
-    def mark_as_shipped(self):
+    def mark_as_shipped(self, user=None):
         """Mark order as shipped"""
-        from django.utils import timezone
-        self.status = 'shipped'
-        self.shipped_at = timezone.now()
-        self.save()
+        from .status import transition_orders
+
+        if transition_orders(Order.objects.filter(pk=self.pk), 'shipped', user=user):
+            self.refresh_from_db(fields=['status', 'shipped_at'])
+            return True
+        return False
 
     @classmethod
     def create_from_cart(cls, cart, address, shipping_cost=0):
-        """Create order from cart"""
-        if not cart.items.exists():
+        """Create order from cart.
+
+        Runs as one transaction: stock is taken with one conditional UPDATE
+        per product, in primary key order so concurrent checkouts lock rows
+        in the same order, and any line that can't be filled rolls it all back.
+        """
+        snapshot = cart.get_snapshot()
+        if not snapshot:
             return None
 
+        quantities = {}
+        for cart_item in snapshot.items:
+            quantities[cart_item.product_id] = quantities.get(cart_item.product_id, 0) + cart_item.quantity
+
         # Calculate totals
-        subtotal = cart.get_total_price()
+        subtotal = snapshot.subtotal
         total_amount = subtotal + shipping_cost
 
-        # Create order
-        order = cls.objects.create(
-            user=cart.user,
-            subtotal=subtotal,
-            shipping_cost=shipping_cost,
-            total_amount=total_amount,
-            address=address
-        )
-
-        # Create order items and reduce stock
-        for cart_item in cart.items.all():
-            if cart_item.product.can_order(cart_item.quantity):
-                OrderItem.objects.create(
+        with transaction.atomic():
+            for product_id, quantity in sorted(quantities.items()):
+                taken = Product.objects.filter(
+                    pk=product_id, is_active=True, stock_quantity__gte=quantity
+                ).update(stock_quantity=F('stock_quantity') - quantity)
+                if not taken:
+                    transaction.set_rollback(True)
+                    return None
+            # Stock was at least the quantity bought, so a 0 now means it just sold out
+            sold_out = Product.objects.filter(pk__in=quantities, stock_quantity=0).exists()
+
+            order = cls.objects.create(
+                user=cart.user,
+                subtotal=subtotal,
+                shipping_cost=shipping_cost,
+                total_amount=total_amount,
+                address=address
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(
                     order=order,
-                    product=cart_item.product,
+                    product_id=cart_item.product_id,
                     quantity=cart_item.quantity,
-                    size=cart_item.size,
-                    color=cart_item.color
+                    size_id=cart_item.size_id,
+                    color_id=cart_item.color_id,
+                    unit_price=cart_item.product.price,
+                    line_total=cart_item.line_total,
                 )
-                cart_item.product.reduce_stock(cart_item.quantity)
-            else:
-                # If any item can't be ordered, delete the order
-                order.delete()
-                return None
-
-        # Clear cart after successful order
-        cart.clear_cart()
+                for cart_item in snapshot.items
+            ])
+            record_sales(quantities.items(), order.created_at)
+
+            # Clear cart after successful order
+            cart.clear_cart()
+
+        stock_changed(quantities, in_stock_changed=sold_out)
         return order
 
 
@@ -129,11 +149,51 @@ class OrderItem(models.Model):
     quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
     size = models.ForeignKey(Size, on_delete=models.CASCADE, null=True, blank=True)
     color = models.ForeignKey(Color, on_delete=models.CASCADE, null=True, blank=True)
+    # Price at checkout, later product price changes don't rewrite history
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
+    line_total = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(0)])
 
     def __str__(self):
         return f"{self.order.order_number} - {self.product.name}(size: {self.size}, color: {self.color}) x {self.quantity}"
 
+    def save(self, *args, **kwargs):
+        if self.unit_price is None:
+            self.unit_price = self.product.price
+        # Unsaved instances may still hold the price as a string
+        self.unit_price = self._meta.get_field('unit_price').to_python(self.unit_price)
+        self.line_total = self.unit_price * self.quantity
+        super().save(*args, **kwargs)
+
     def get_total_price(self):
-        """Calculate total price for this order item"""
-        return self.product.price * self.quantity
+        """Total price for this order item as charged at checkout"""
+        return self.line_total
+
+
+
+class OrderStatusEvent(models.Model):
+    """Append-only history of order status changes"""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='status_events')
+    from_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['order', 'created_at'], name='order_status_event_order_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.order_id}: {self.from_status} -> {self.to_status}"
+
+    @classmethod
+    def record(cls, changes, to_status, user=None):
+        """Write one event per (order_id, from_status) pair in bulk"""
+        return cls.objects.bulk_create(
+            [
+                cls(order_id=order_id, from_status=from_status, to_status=to_status, changed_by=user)
+                for order_id, from_status in changes
+            ],
+            batch_size=1000,
+        )
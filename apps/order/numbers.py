@@ -0,0 +1,89 @@
+import secrets
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+ORDER_NUMBER_PREFIX = 'ORD-'
+DEFAULT_GENERATOR = 'apps.order.numbers.time_ordered_number'
+
+# Crockford base32: no I, L, O or U, so numbers read back over the phone
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+# 42 bits of milliseconds since EPOCH_MS last until 2165, 33 random bits
+# follow; 75 bits are 15 base32 digits, plus one check symbol = 20 chars.
+EPOCH_MS = 1767225600000  # 2026-01-01 UTC
+TIME_BITS = 42
+RANDOM_BITS = 33
+BODY_LENGTH = (TIME_BITS + RANDOM_BITS) // 5
+
+
+def encode(value, length):
+    digits = []
+    for _ in range(length):
+        value, digit = divmod(value, 32)
+        digits.append(ALPHABET[digit])
+    return ''.join(reversed(digits))
+
+
+def check_symbol(body):
+    """Luhn mod 32 check symbol: catches any single mistyped character and
+    most swaps of neighbours, and stays inside the URL-safe alphabet"""
+    total = 0
+    for position, char in enumerate(reversed(body)):
+        addend = ALPHABET.index(char) * (2 if position % 2 == 0 else 1)
+        total += addend // 32 + addend % 32
+    return ALPHABET[-total % 32]
+
+
+def is_valid_order_number(order_number):
+    body = order_number.removeprefix(ORDER_NUMBER_PREFIX)
+    if len(body) != BODY_LENGTH + 1 or any(char not in ALPHABET for char in body[:-1]):
+        return False
+    return check_symbol(body[:-1]) == body[-1]
+
+
+class TimeOrderedGenerator:
+    """ULID-style numbers: millisecond timestamp followed by random bits.
+
+    Numbers sort by creation time. Within one process the random part is
+    incremented while the clock stands still, so it never repeats; across
+    processes two orders in the same millisecond collide with odds of one
+    in 2**33, and the unique constraint on order_number still backs that.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._random = 0
+
+    def _next(self):
+        with self._lock:
+            now = max(int(time.time() * 1000) - EPOCH_MS, self._last_ms)
+            if now == self._last_ms:
+                self._random += 1
+                if self._random >> RANDOM_BITS:
+                    # Random space exhausted within one millisecond, borrow the next one
+                    now += 1
+                    self._random = secrets.randbits(RANDOM_BITS)
+            else:
+                self._random = secrets.randbits(RANDOM_BITS)
+            self._last_ms = now
+            return now << RANDOM_BITS | self._random
+
+    def __call__(self):
+        body = encode(self._next(), BODY_LENGTH)
+        return f'{ORDER_NUMBER_PREFIX}{body}{check_symbol(body)}'
+
+
+time_ordered_number = TimeOrderedGenerator()
+
+
+def get_order_number_generator():
+    """The callable named by settings.ORDER_NUMBER_GENERATOR"""
+    return import_string(getattr(settings, 'ORDER_NUMBER_GENERATOR', DEFAULT_GENERATOR))
+
+
+def generate_order_number():
+    return get_order_number_generator()()
@@ -0,0 +1,46 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .cancellation import cancel_orders
+from .models import Order, OrderStatusEvent
+
+# Target status -> statuses an order may move to it from
+TRANSITIONS = {
+    'confirmed': ('pending',),
+    'processing': ('confirmed',),
+    'shipped': ('confirmed', 'processing'),
+    'delivered': ('shipped',),
+}
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+def transition_orders(orders, to_status, user=None):
+    """Move every order in `orders` that may go to `to_status` there.
+
+    The source states are checked in SQL, orders in any other state are
+    left alone. The status change is one UPDATE for the whole set and one
+    OrderStatusEvent is written per moved order. Returns the number moved.
+    """
+    if to_status == 'cancelled':
+        # Cancelling also restocks, see cancel_orders
+        return cancel_orders(orders, user=user)
+    if to_status not in TRANSITIONS:
+        raise InvalidTransition(f'Orders cannot be moved to "{to_status}".')
+
+    movable = Order.objects.filter(pk__in=orders.values('pk'), status__in=TRANSITIONS[to_status])
+    updates = {'status': to_status}
+    if to_status == 'shipped':
+        updates['shipped_at'] = timezone.now()
+
+    with transaction.atomic():
+        # Locked, so no other transition can move these rows before the UPDATE
+        # and the events record the status each order really left
+        changes = list(movable.select_for_update().order_by('pk').values_list('pk', 'status'))
+        if not changes:
+            return 0
+        Order.objects.filter(pk__in=[pk for pk, _ in changes]).update(**updates)
+        OrderStatusEvent.record(changes, to_status, user=user)
+    return len(changes)
@@ -1,3 +1,216 @@
-from django.test import TestCase
+import threading
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+
+from apps.cart.models import Cart, CartItem
+from apps.product.cache import get_catalogue_version
+from apps.product.models import Product, ProductStats
+
+from main.models import User
+
+from .cancellation import cancel_orders
+from .models import Address, Order, OrderItem, OrderStatusEvent
+from .status import InvalidTransition, transition_orders
+
+
+def make_address():
+    return Address.objects.create(name='Buyer', phone='0123', district='Dhaka', address='Road 1')
+
+
+class CreateFromCartTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.shirt = Product.objects.create(name='Shirt', price='25.50', sku='SHIRT-1', stock_quantity=5)
+        self.socks = Product.objects.create(name='Socks', price='4.00', sku='SOCKS-1', stock_quantity=2)
+        self.cart = Cart.objects.create(session_id='abc')
+        CartItem.objects.create(cart=self.cart, product=self.shirt, quantity=2)
+        CartItem.objects.create(cart=self.cart, product=self.socks, quantity=2)
+
+    def test_takes_stock_and_writes_lines(self):
+        order = Order.create_from_cart(self.cart, make_address(), shipping_cost=60)
+        self.assertEqual(order.total_amount, 119)
+        self.assertEqual(order.items.count(), 2)
+        self.assertEqual(
+            dict(Product.objects.values_list('sku', 'stock_quantity')), {'SHIRT-1': 3, 'SOCKS-1': 0}
+        )
+        self.assertEqual(ProductStats.objects.get(product=self.shirt).units_sold, 2)
+        self.assertFalse(self.cart.items.exists())
+
+    def test_lines_keep_checkout_prices(self):
+        order = Order.create_from_cart(self.cart, make_address())
+        Product.objects.filter(pk=self.shirt.pk).update(price='99.00')
+        with self.assertNumQueries(1):
+            lines = list(order.items.order_by('pk').values_list('unit_price', 'line_total'))
+        self.assertEqual([tuple(map(str, line)) for line in lines], [('25.50', '51.00'), ('4.00', '8.00')])
+        self.assertEqual(order.items.aggregate(total=Sum('line_total'))['total'], order.subtotal)
+
+    def test_single_item_save_prices_from_product(self):
+        order = Order.objects.create(subtotal=0, total_amount=0)
+        item = OrderItem.objects.create(order=order, product=self.shirt, quantity=3)
+        self.assertEqual((str(item.unit_price), str(item.line_total)), ('25.50', '76.50'))
+
+    def test_short_stock_rolls_everything_back(self):
+        Product.objects.filter(pk=self.socks.pk).update(stock_quantity=1)
+        self.assertIsNone(Order.create_from_cart(self.cart, make_address()))
+        self.assertEqual(Product.objects.get(pk=self.shirt.pk).stock_quantity, 5)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.cart.items.count(), 2)
+
+
+
+class CancelOrdersTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.shirt = Product.objects.create(name='Shirt', price='25.50', sku='SHIRT-1', stock_quantity=10)
+        self.socks = Product.objects.create(name='Socks', price='4.00', sku='SOCKS-1', stock_quantity=10)
+
+    def place(self, *lines):
+        cart = Cart.objects.create()
+        for product, quantity in lines:
+            CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+        return Order.create_from_cart(cart, make_address())
+
+    def stock(self):
+        return dict(Product.objects.values_list('sku', 'stock_quantity'))
+
+    def test_bulk_cancel_restocks_once(self):
+        first = self.place((self.shirt, 2), (self.socks, 1))
+        second = self.place((self.shirt, 3))
+        shipped = self.place((self.socks, 4))
+        Order.objects.filter(pk=shipped.pk).update(status='shipped')
+
+        self.assertEqual(cancel_orders(Order.objects.all()), 2)
+        self.assertEqual(self.stock(), {'SHIRT-1': 10, 'SOCKS-1': 6})
+        self.assertEqual(ProductStats.objects.get(product=self.shirt).units_sold, 0)
+        self.assertEqual(ProductStats.objects.get(product=self.socks).order_count, 1)
+
+        self.assertFalse(first.cancel_order())
+        self.assertEqual(cancel_orders(Order.objects.filter(pk=second.pk)), 0)
+        self.assertEqual(self.stock(), {'SHIRT-1': 10, 'SOCKS-1': 6})
+
+    def test_cancel_order_uses_one_stock_update(self):
+        order = self.place((self.shirt, 2), (self.socks, 1))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(order.cancel_order())
+        self.assertEqual(order.status, 'cancelled')
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "product_product"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.stock(), {'SHIRT-1': 10, 'SOCKS-1': 10})
+
+    def test_catalogue_version_changes_only_with_in_stock_status(self):
+        version = get_catalogue_version()
+        partial = self.place((self.shirt, 2))
+        cancel_orders(Order.objects.filter(pk=partial.pk))
+        self.assertEqual(get_catalogue_version(), version)
+
+        sold_out = self.place((self.shirt, 10))
+        self.assertNotEqual(get_catalogue_version(), version)
+        version = get_catalogue_version()
+        cancel_orders(Order.objects.filter(pk=sold_out.pk))
+        self.assertNotEqual(get_catalogue_version(), version)
+
+
+
+class OrderStatusTransitionTest(TestCase):
+
+    def setUp(self):
+        self.orders = [Order.objects.create(subtotal=0, total_amount=0) for _ in range(4)]
+        Order.objects.filter(pk=self.orders[3].pk).update(status='delivered')
+
+    def test_bulk_transition_checks_source_states(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(transition_orders(Order.objects.all(), 'confirmed'), 3)
+        statements = [q['sql'].split()[0] for q in queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(statements, ['SELECT', 'UPDATE', 'INSERT'])
+        self.assertEqual(transition_orders(Order.objects.all(), 'shipped'), 3)
+        self.assertEqual(transition_orders(Order.objects.all(), 'confirmed'), 0)
+
+        shipped = Order.objects.filter(status='shipped')
+        self.assertEqual(shipped.count(), 3)
+        self.assertFalse(shipped.filter(shipped_at__isnull=True).exists())
+        self.assertEqual(
+            list(self.orders[0].status_events.values_list('from_status', 'to_status')),
+            [('pending', 'confirmed'), ('confirmed', 'shipped')],
+        )
+        self.assertFalse(self.orders[3].status_events.exists())
+
+    def test_cancel_is_recorded_and_unknown_target_rejected(self):
+        self.assertEqual(transition_orders(Order.objects.all(), 'cancelled'), 3)
+        self.assertEqual(OrderStatusEvent.objects.filter(to_status='cancelled').count(), 3)
+        with self.assertRaises(InvalidTransition):
+            transition_orders(Order.objects.all(), 'pending')
+
+    def test_cancel_order_records_the_user(self):
+        user = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+        self.assertTrue(self.orders[0].cancel_order(user=user))
+        self.assertEqual(self.orders[0].status_events.get().changed_by, user)
+
+    def test_admin_status_is_read_only(self):
+        from django.contrib import admin
+
+        order_admin = admin.site._registry[Order]
+        self.assertFalse(order_admin.list_editable)
+        self.assertIn('status', order_admin.readonly_fields)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentCheckoutTest(TransactionTestCase):
+    """Parallel checkouts of the last units must not oversell"""
+
+    buyers = 8
+
+    def test_no_oversell(self):
+        cache.clear()
+        product = Product.objects.create(name='Lamp', price='10.00', sku='LAMP-1', stock_quantity=3)
+        carts = []
+        for i in range(self.buyers):
+            cart = Cart.objects.create(session_id=f'buyer-{i}')
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+            carts.append(cart)
+
+        barrier = threading.Barrier(self.buyers)
+        results = []
+
+        def checkout(cart):
+            try:
+                barrier.wait()
+                results.append(Order.create_from_cart(cart, make_address()))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(cart,)) for cart in carts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len([order for order in results if order]), 3)
+        self.assertEqual(Product.objects.get(pk=product.pk).stock_quantity, 0)
+        self.assertEqual(OrderItem.objects.count(), 3)
+
+
+class OrderNumberTest(TestCase):
+
+    def test_numbers_are_unique_ordered_and_checked(self):
+        from .numbers import TimeOrderedGenerator, is_valid_order_number
+
+        generate = TimeOrderedGenerator()
+        numbers = [generate() for _ in range(2000)]
+        self.assertEqual(len(set(numbers)), len(numbers))
+        self.assertEqual(numbers, sorted(numbers))
+        self.assertTrue(all(len(number) == 20 and is_valid_order_number(number) for number in numbers))
+
+        number = numbers[0]
+        typo = number[:-3] + ('1' if number[-3] != '1' else '2') + number[-2:]
+        self.assertFalse(is_valid_order_number(typo))
+
+    def test_save_assigns_number_without_lookup(self):
+        with self.assertNumQueries(1):
+            order = Order.objects.create(subtotal=0, total_amount=0)
+        self.assertTrue(order.order_number.startswith('ORD-'))
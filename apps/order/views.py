@@ -2,14 +2,17 @@ from django.contrib import messages
 from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
 from .models import Order, Address
-from main.models import Config
-from apps.cart.views import get_or_create_cart
+from main.config import get_config
+from apps.cart.summary import updates_cart_summary
+from apps.cart.views import get_cart
 from .districts import districts
 
+@updates_cart_summary
 def checkout_view(request):
-    cart = get_or_create_cart(request)
+    cart = get_cart(request)
+    snapshot = cart.get_snapshot() if cart else None
 
-    if not cart.items.exists():
+    if not snapshot:
         messages.warning(request, 'Your cart is empty.')
         return redirect('cart')
     
@@ -33,7 +36,7 @@ def checkout_view(request):
             address=address_text,
         )
 
-        config = Config.objects.first()
+        config = get_config()
         if not config:
             messages.error(request, 'Configuration settings are missing.')
             return redirect('cart')
@@ -57,8 +60,8 @@ def checkout_view(request):
     context = {
         'cart': cart,
         'districts': districts,
-        'cart_items': cart.items.select_related('product').all(),
-        'subtotal': cart.get_total_price(),
+        'cart_items': snapshot.items,
+        'subtotal': snapshot.subtotal,
         'initial_data': initial_data,  # <<< পাঠাতে হবে template-এ
     }
     return render(request, 'order/checkout.html', context)
@@ -110,7 +113,7 @@ def cancel_order(request, order_number):
         user=request.user
     )
     
-    if order.cancel_order():
+    if order.cancel_order(user=request.user):
         messages.success(request, f'Order {order.order_number} has been cancelled.')
     else:
         messages.error(request, 'This order cannot be cancelled.')
@@ -0,0 +1,84 @@
+import uuid
+
+from django.core.cache import cache
+
+CATALOGUE_VERSION_KEY = 'product:catalogue_version'
+
+
+def new_version():
+    """Random version token. Unlike a counter it never repeats, so a key that was
+    evicted can't restart at a version whose cached entries are still around."""
+    return uuid.uuid4().hex[:16]
+
+
+def get_version(key):
+    """Current token stored under key, created on first use"""
+    version = cache.get(key)
+    if version is None:
+        # add() so concurrent first readers settle on one token
+        cache.add(key, new_version(), None)
+        version = cache.get(key)
+    # Evicted again in between: an unsaved token only means a cache miss
+    return version or new_version()
+
+
+def bump_version(key):
+    """Replace the token under key, making everything cached against it stale"""
+    version = new_version()
+    cache.set(key, version, None)
+    return version
+
+
+def get_catalogue_version():
+    """Current catalogue version, bumped whenever products or categories change"""
+    return get_version(CATALOGUE_VERSION_KEY)
+
+
+def bump_catalogue_version():
+    """Invalidate everything cached against the catalogue version"""
+    return bump_version(CATALOGUE_VERSION_KEY)
+
+
+def catalogue_cache_key(prefix, *parts):
+    """Build a cache key that goes stale with the catalogue version"""
+    return ':'.join(['product', prefix, str(get_catalogue_version()), *map(str, parts)])
+
+
+FRAGMENT_CACHE_TIMEOUT = 60 * 60
+
+
+def _product_version_key(product_id):
+    return f'product:version:{product_id}'
+
+
+def get_product_version(product_id):
+    """Per-product version, bumped when the product's sizes, colors or images change"""
+    return get_version(_product_version_key(product_id))
+
+
+def get_product_versions(product_ids):
+    """Per-product versions of several products, read in one round trip"""
+    keys = {_product_version_key(product_id): product_id for product_id in product_ids}
+    found = cache.get_many(keys)
+    return {product_id: found.get(key) or get_version(key) for key, product_id in keys.items()}
+
+
+def bump_product_versions(product_ids):
+    """Invalidate the cached fragments of the given products"""
+    cache.set_many({_product_version_key(product_id): new_version() for product_id in set(product_ids)}, None)
+
+
+def stock_changed(product_ids, in_stock_changed=False):
+    """Invalidate caches after stock UPDATEs, which bypass Product.save and its signals.
+
+    Listings and facets only show whether a product is in stock, so the
+    catalogue version is bumped only when a product sold out or came back.
+    """
+    if in_stock_changed:
+        bump_catalogue_version()
+    bump_product_versions(product_ids)
+
+
+def product_fragment_key(product):
+    """Fragment cache key part that changes with product edits and variant changes"""
+    return f'{product.pk}.{product.updated_at.timestamp():.6f}.{get_product_version(product.pk)}'
@@ -0,0 +1,45 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from main.context_processors import get_site_context
+from main.pagecache import get_page_cache_version, normalize_query_string
+
+
+class ConditionalGetMixin:
+    """Answer conditional GETs from cheap validators before any rendering.
+
+    Views describe their content through get_etag_parts(). There is no
+    Last-Modified: stock UPDATEs, variant, config and cart changes move the
+    ETag but not updated_at, and a date-only revalidation would get a 304.
+    Pages that show nothing visitor-specific are public for cache_max_age
+    seconds; others are private and revalidated.
+    """
+    cache_max_age = 60
+
+    def get_etag_parts(self):
+        return [get_page_cache_version(), normalize_query_string(self.request.META.get('QUERY_STRING', ''))]
+
+    def get_etag(self):
+        site = get_site_context(self.request)
+        parts = self.get_etag_parts()
+        if not site.is_shared:
+            parts += [self.request.user.pk, site.cart_count]
+        return 'W/"%s"' % hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+
+    def get(self, request, *args, **kwargs):
+        site = get_site_context(request)
+        if site.has_messages:
+            # Messages are shown once, never answer with 304
+            return super().get(request, *args, **kwargs)
+
+        etag = self.get_etag()
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        response.headers.setdefault('ETag', etag)
+        if site.is_shared:
+            patch_cache_control(response, public=True, max_age=self.cache_max_age)
+        else:
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
@@ -0,0 +1,62 @@
+import json
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from .cache import catalogue_cache_key
+
+COUNT_CACHE_TIMEOUT = 60 * 15
+
+
+def estimate_count(queryset):
+    """Planner row estimate for a queryset (Postgres only), without scanning it"""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def get_cached_count(queryset, key, estimate_above=None, timeout=COUNT_CACHE_TIMEOUT):
+    """Count a queryset once per catalogue version and filter key.
+
+    When estimate_above is set and the planner expects more rows than that,
+    the estimate is used instead of an exact COUNT(*).
+    """
+    cache_key = catalogue_cache_key('count', key)
+    count = cache.get(cache_key)
+    if count is not None:
+        return count
+
+    count = None
+    if estimate_above is not None:
+        estimate = estimate_count(queryset)
+        if estimate is not None and estimate > estimate_above:
+            count = estimate
+    if count is None:
+        count = queryset.count()
+
+    cache.set(cache_key, count, timeout)
+    return count
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator whose count comes from get_cached_count"""
+
+    def __init__(self, object_list, per_page, count_key=None, estimate_above=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_key = count_key
+        self.estimate_above = estimate_above
+
+    @cached_property
+    def count(self):
+        if self.count_key is None:
+            return super().count
+        return get_cached_count(self.object_list, self.count_key, self.estimate_above)
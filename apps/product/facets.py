@@ -0,0 +1,107 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .cache import catalogue_cache_key
+from .filters import filter_signature
+from .models import Category, Product
+from .search import filter_matching
+
+FACET_CACHE_TIMEOUT = 60 * 15
+
+# (min, max, label) - max is exclusive, None means unbounded
+PRICE_RANGES = [
+    (0, 25, "Under $25"),
+    (25, 50, "$25 - $50"),
+    (50, 100, "$50 - $100"),
+    (100, 200, "$100 - $200"),
+    (200, None, "Over $200"),
+]
+
+
+def _price_range_q(low, high):
+    q = Q(price__gte=low)
+    if high is not None:
+        q &= Q(price__lt=high)
+    return q
+
+
+def _price_filter_q(filters):
+    q = Q()
+    if filters.get('min_price'):
+        q &= Q(price__gte=Decimal(filters['min_price']))
+    if filters.get('max_price'):
+        q &= Q(price__lte=Decimal(filters['max_price']))
+    return q
+
+
+def get_categories():
+    """All categories, cached per catalogue version"""
+    key = catalogue_cache_key('categories')
+    categories = cache.get(key)
+    if categories is None:
+        categories = list(Category.objects.order_by('name'))
+        cache.set(key, categories, FACET_CACHE_TIMEOUT)
+    return categories
+
+
+def compute_facets(filters):
+    """Category, price-bucket and in-stock counts for a listing filter set in one query.
+
+    Each facet ignores its own filter: category counts respect the price
+    filter, price buckets respect the category filter, so the sidebar shows
+    what selecting another option would return.
+    """
+    queryset = Product.objects.filter(is_active=True)
+    if filters.get('q'):
+        queryset = filter_matching(queryset, filters['q'])
+
+    price_q = _price_filter_q(filters)
+    aggregates = {
+        'matched': Count('pk', filter=price_q),
+        'in_stock': Count('pk', filter=price_q & Q(stock_quantity__gt=0)),
+    }
+    for i, (low, high, _) in enumerate(PRICE_RANGES):
+        aggregates[f'price_{i}'] = Count('pk', filter=_price_range_q(low, high))
+
+    rows = queryset.order_by().values('category_id', 'category__slug').annotate(**aggregates)
+
+    category_slug = filters.get('category')
+    category_counts = {}
+    price_counts = [0] * len(PRICE_RANGES)
+    total = in_stock = 0
+    for row in rows:
+        category_counts[row['category_id']] = row['matched']
+        if category_slug and row['category__slug'] != category_slug:
+            continue
+        total += row['matched']
+        in_stock += row['in_stock']
+        for i in range(len(PRICE_RANGES)):
+            price_counts[i] += row[f'price_{i}']
+
+    categories = []
+    for category in get_categories():
+        category.product_count = category_counts.get(category.pk, 0)
+        categories.append(category)
+
+    return {
+        'categories': categories,
+        'price_ranges': [
+            (low, high, label, count)
+            for (low, high, label), count in zip(PRICE_RANGES, price_counts)
+        ],
+        'in_stock': in_stock,
+        'total': total,
+    }
+
+
+def get_facets(filters=None):
+    """Facet counts for a listing filter set, cached per filter signature"""
+    filters = filters or {}
+    key = catalogue_cache_key('facets', filter_signature(filters))
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(filters)
+        cache.set(key, facets, FACET_CACHE_TIMEOUT)
+    return facets
@@ -0,0 +1,33 @@
+import hashlib
+import json
+from decimal import Decimal, InvalidOperation
+
+from .search import tokenize
+
+LISTING_FILTERS = ('q', 'category', 'min_price', 'max_price')
+
+
+def _normalize_price(value):
+    try:
+        price = Decimal(value)
+    except (InvalidOperation, TypeError, ValueError):
+        return ''
+    if not price.is_finite() or price < 0:
+        return ''
+    return str(price.normalize())
+
+
+def get_listing_filters(params):
+    """Normalize product listing filters from request GET params"""
+    return {
+        'q': ' '.join(tokenize(params.get('q', ''))),
+        'category': params.get('category', '').strip(),
+        'min_price': _normalize_price(params.get('min_price')),
+        'max_price': _normalize_price(params.get('max_price')),
+    }
+
+
+def filter_signature(filters):
+    """Stable short hash of a normalized filter set, for cache keys"""
+    payload = json.dumps({key: filters.get(key, '') for key in LISTING_FILTERS}, sort_keys=True)
+    return hashlib.md5(payload.encode()).hexdigest()
@@ -0,0 +1,365 @@
+import csv
+import io
+import json
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .cache import bump_catalogue_version
+from .models import Category, Color, Image, Product, Size
+from .search import index_products
+from .slugs import assign_slugs
+
+BATCH_SIZE = 500
+LIST_SEPARATOR = '|'
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'on'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'off', ''}
+# Errors kept for display; later ones are only counted
+MAX_ERRORS = 1000
+PRODUCT_FIELDS = (
+    'name', 'category', 'short_description', 'description', 'price',
+    'stock_quantity', 'is_active', 'is_featured',
+)
+
+
+class RowError(Exception):
+    pass
+
+
+class FileError(RowError):
+    """The rest of the file can't be read; rows before it are still imported"""
+
+
+class ImportResult:
+    """Counters and per-row errors of an import run"""
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+        self.error_count = 0
+        self.stopped = None
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0
+
+    def add_error(self, line, sku, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({'line': line, 'sku': sku, 'message': message})
+
+    def summary(self):
+        summary = (
+            f"{self.rows} rows: {self.created} created, {self.updated} updated, "
+            f"{self.error_count} errors in {self.elapsed:.2f}s ({self.rows_per_second:.0f} rows/s)"
+        )
+        if self.stopped:
+            summary += f"; stopped at line {self.stopped['line']}: {self.stopped['message']}"
+        return summary
+
+
+# ---------------- Reading ----------------
+
+def detect_format(filename):
+    name = (filename or '').lower()
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return 'csv'
+
+
+def read_rows(stream, file_format='csv'):
+    """Yield (line number, raw row dict) from a text stream without loading it whole.
+
+    A file that stops being readable, such as a non UTF-8 export or broken
+    CSV quoting, ends the rows with a FileError.
+    """
+    line_number = 0
+    try:
+        if file_format == 'jsonl':
+            for line_number, line in enumerate(stream, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as exc:
+                    yield line_number, RowError(f'Invalid JSON: {exc}')
+                    continue
+                yield line_number, row if isinstance(row, dict) else RowError('Row is not a JSON object')
+            return
+
+        reader = csv.DictReader(stream)
+        for row in reader:
+            line_number = reader.line_num
+            yield line_number, row
+    except UnicodeDecodeError:
+        # Decoding runs ahead in chunks, so the line is approximate
+        yield line_number + 1, FileError('file is not UTF-8, save it as CSV UTF-8 and import the rest again')
+    except csv.Error as exc:
+        yield line_number + 1, FileError(f'unreadable CSV: {exc}')
+    except ValueError as exc:
+        yield line_number + 1, FileError(f'unreadable file: {exc}')
+
+
+def open_upload(uploaded_file):
+    """Text stream over an uploaded file, read from its temporary file in chunks"""
+    return io.TextIOWrapper(uploaded_file.file, encoding='utf-8-sig', newline='')
+
+
+# ---------------- Validation ----------------
+
+def _validated(field, value):
+    """Run value through the Product field's validators, so rows the database
+    would reject fail on their own instead of rolling back their batch"""
+    try:
+        Product._meta.get_field(field).run_validators(value)
+    except ValidationError as exc:
+        raise RowError(f'{field}: {" ".join(exc.messages)}')
+    return value
+
+
+def _split(value):
+    if value is None:
+        return None
+    if isinstance(value, list):
+        return [str(item).strip() for item in value if str(item).strip()]
+    return [item.strip() for item in str(value).split(LIST_SEPARATOR) if item.strip()]
+
+
+def _bool(value, field):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise RowError(f'{field}: expected a boolean, got "{value}"')
+
+
+def _colors(value):
+    colors = []
+    for item in value if isinstance(value, list) else _split(value) or []:
+        if isinstance(item, dict):
+            name, hex_code = item.get('name', ''), item.get('hex_code', '')
+        else:
+            name, _, hex_code = str(item).partition(':')
+        name, hex_code = str(name).strip(), str(hex_code).strip()
+        if not name:
+            continue
+        if len(hex_code) > 7:
+            raise RowError(f'colors: invalid hex code "{hex_code}"')
+        colors.append((name[:50], hex_code))
+    return colors
+
+
+def clean_row(row):
+    """Validate and normalize one raw row"""
+    sku = str(row.get('sku') or '').strip()
+    if not sku:
+        raise RowError('sku is required')
+    if len(sku) > 50:
+        raise RowError('sku is longer than 50 characters')
+
+    data = {'sku': sku}
+    name = str(row.get('name') or '').strip()
+    if name:
+        data['name'] = name[:200]
+
+    if row.get('price') not in (None, ''):
+        try:
+            price = Decimal(str(row['price']).strip())
+        except InvalidOperation:
+            raise RowError(f'price: "{row["price"]}" is not a number')
+        if not price.is_finite() or price < 0:
+            raise RowError('price must be zero or more')
+        try:
+            price = price.quantize(Decimal('0.01'))
+        except InvalidOperation:
+            raise RowError(f'price: "{row["price"]}" is too large')
+        data['price'] = _validated('price', price)
+
+    if row.get('stock_quantity') not in (None, ''):
+        try:
+            stock = int(str(row['stock_quantity']).strip())
+        except ValueError:
+            raise RowError(f'stock_quantity: "{row["stock_quantity"]}" is not a whole number')
+        if stock < 0:
+            raise RowError('stock_quantity must be zero or more')
+        data['stock_quantity'] = _validated('stock_quantity', stock)
+
+    for field in ('short_description', 'description'):
+        if row.get(field) is not None:
+            data[field] = str(row[field])
+    for field in ('is_active', 'is_featured'):
+        if row.get(field) not in (None, ''):
+            data[field] = _bool(row[field], field)
+    if row.get('category') is not None:
+        data['category'] = str(row['category']).strip()[:100]
+
+    data['sizes'] = [size[:50] for size in _split(row.get('sizes')) or []]
+    data['colors'] = _colors(row.get('colors'))
+    data['images'] = _split(row.get('images')) or []
+    return data
+
+
+# ---------------- Writing ----------------
+
+def _resolve_categories(names):
+    """Category ids by name, creating missing categories in bulk"""
+    names = {name for name in names if name}
+    if not names:
+        return {}
+    categories = {category.name: category.pk for category in Category.objects.filter(name__in=names)}
+    missing = [Category(name=name) for name in names if name not in categories]
+    if missing:
+        assign_slugs(missing)
+        for category in Category.objects.bulk_create(missing):
+            categories[category.name] = category.pk
+    return categories
+
+
+def write_batch(rows, result):
+    """Upsert one batch of cleaned rows in a single transaction"""
+    rows_by_sku = {}
+    for line, data in rows:
+        if data['sku'] in rows_by_sku:
+            result.add_error(line, data['sku'], 'duplicate sku in the same batch, later row ignored')
+            continue
+        rows_by_sku[data['sku']] = (line, data)
+
+    with transaction.atomic():
+        categories = _resolve_categories(data.get('category') for _, data in rows_by_sku.values())
+        existing = {product.sku: product for product in Product.objects.filter(sku__in=rows_by_sku)}
+
+        to_create = []
+        to_update = []
+        update_fields = set()
+        for sku, (line, data) in rows_by_sku.items():
+            product = existing.get(sku)
+            if product is None:
+                if 'name' not in data or 'price' not in data:
+                    result.add_error(line, sku, 'name and price are required for new products')
+                    continue
+                product = Product(sku=sku)
+                to_create.append(product)
+            else:
+                product.updated_at = timezone.now()
+                to_update.append(product)
+            for field in PRODUCT_FIELDS:
+                if field not in data:
+                    continue
+                if field == 'category':
+                    product.category_id = categories.get(data['category'])
+                    update_fields.add('category')
+                else:
+                    setattr(product, field, data[field])
+                    update_fields.add(field)
+
+        assign_slugs(to_create)
+        Product.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+        if to_update:
+            Product.objects.bulk_update(to_update, sorted(update_fields | {'updated_at'}), batch_size=BATCH_SIZE)
+
+        products = {product.sku: product for product in to_create + to_update}
+        _write_variants(products, rows_by_sku)
+        index_products(product.pk for product in products.values())
+
+    result.created += len(to_create)
+    result.updated += len(to_update)
+
+
+def _write_variants(products, rows_by_sku):
+    sizes = []
+    colors = []
+    images = []
+    for sku, product in products.items():
+        _, data = rows_by_sku[sku]
+        sizes.extend(Size(product=product, name=name) for name in data['sizes'])
+        colors.extend(Color(product=product, name=name, hex_code=hex_code) for name, hex_code in data['colors'])
+        images.extend((product, public_id) for public_id in data['images'])
+
+    Size.objects.bulk_create(sizes, ignore_conflicts=True, batch_size=BATCH_SIZE)
+    Color.objects.bulk_create(
+        colors,
+        update_conflicts=True,
+        unique_fields=['product', 'name'],
+        update_fields=['hex_code'],
+        batch_size=BATCH_SIZE,
+    )
+    if not images:
+        return
+
+    image_field = Image._meta.get_field('image')
+    product_ids = {product.pk for product, _ in images}
+    known = {
+        (product_id, str(image_field.to_python(value)))
+        for product_id, value in Image.objects.filter(product_id__in=product_ids).values_list('product_id', 'image')
+    }
+    has_primary = {product.pk for product, _ in images if product.primary_image_id}
+    new_images = []
+    for product, public_id in images:
+        key = (product.pk, str(image_field.to_python(public_id)))
+        if key in known:
+            continue
+        known.add(key)
+        # bulk_create skips Image.save, so the first image becomes primary here
+        is_primary = product.pk not in has_primary
+        has_primary.add(product.pk)
+        new_images.append(Image(product=product, image=public_id, is_primary=is_primary))
+    Image.objects.bulk_create(new_images, batch_size=BATCH_SIZE)
+
+    primaries = []
+    for image in new_images:
+        if image.is_primary:
+            image.product.primary_image = image
+            image.product.primary_image_url = image.get_image_url()
+            primaries.append(image.product)
+    Product.objects.bulk_update(primaries, ['primary_image', 'primary_image_url'], batch_size=BATCH_SIZE)
+
+
+def import_products(stream, file_format='csv', batch_size=BATCH_SIZE, progress=None):
+    """Stream rows from a CSV/JSONL text stream into the catalogue in batches"""
+    result = ImportResult()
+    rows = read_rows(stream, file_format)
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            break
+        result.rows += sum(not isinstance(row, FileError) for _, row in chunk)
+
+        cleaned = []
+        for line, row in chunk:
+            try:
+                if isinstance(row, RowError):
+                    raise row
+                cleaned.append((line, clean_row(row)))
+            except RowError as exc:
+                sku = row.get('sku', '') if isinstance(row, dict) else ''
+                result.add_error(line, sku, str(exc))
+                if isinstance(exc, FileError):
+                    result.stopped = {'line': line, 'message': str(exc)}
+
+        try:
+            write_batch(cleaned, result)
+        except DatabaseError as exc:
+            first, last = chunk[0][0], chunk[-1][0]
+            result.add_error(first, '', f'batch of lines {first}-{last} rolled back: {exc}')
+
+        if progress:
+            progress(result)
+
+    if result.created or result.updated:
+        bump_catalogue_version()
+    return result
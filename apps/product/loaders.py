@@ -0,0 +1,70 @@
+from django.db.models import Prefetch, prefetch_related_objects
+from django.utils.functional import cached_property
+
+from .cache import FRAGMENT_CACHE_TIMEOUT, product_fragment_key
+from .models import Color, Image, Product, Size
+from .related import get_related_products
+
+DETAIL_PREFETCHES = (
+    Prefetch('sizes', queryset=Size.objects.order_by('id')),
+    Prefetch('colors', queryset=Color.objects.order_by('id')),
+    Prefetch('images', queryset=Image.objects.order_by('id')),
+)
+
+
+def product_detail_queryset():
+    """Active products with their category, in one query"""
+    return Product.objects.filter(is_active=True).select_related('category').defer('search_vector')
+
+
+class ProductDetail:
+    """Everything product_detail.html renders, loaded on first use.
+
+    Sizes, colors and images are prefetched together (three queries) the
+    first time any of them is read, so a page whose fragments are cached
+    runs none of them.
+    """
+
+    def __init__(self, product):
+        self.product = product
+
+    @cached_property
+    def fragment_key(self):
+        return product_fragment_key(self.product)
+
+    @property
+    def fragment_timeout(self):
+        return FRAGMENT_CACHE_TIMEOUT
+
+    @cached_property
+    def _variants(self):
+        prefetch_related_objects([self.product], *DETAIL_PREFETCHES)
+        return {
+            'sizes': list(self.product.sizes.all()),
+            'colors': list(self.product.colors.all()),
+            'images': list(self.product.images.all()),
+        }
+
+    @property
+    def sizes(self):
+        return self._variants['sizes']
+
+    @property
+    def colors(self):
+        return self._variants['colors']
+
+    @property
+    def images(self):
+        return self._variants['images']
+
+    @cached_property
+    def related_products(self):
+        return get_related_products(self.product)
+
+
+def product_detail_context(product):
+    """Template context for product_detail.html"""
+    return {
+        'detail': ProductDetail(product),
+        'primary_image_url': product.primary_image_url,
+    }
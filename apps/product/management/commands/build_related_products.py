@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.product.related import build_related_products
+
+
+class Command(BaseCommand):
+    help = 'Build the frequently-bought-together table from order history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild from the whole order history')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Orders processed per batch')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        orders, pairs, fallback = build_related_products(
+            full=options['full'],
+            batch_size=options['batch_size'],
+        )
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {orders} orders ({pairs} product pairs, {fallback} category fallbacks) in {elapsed:.2f}s'
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.product.importer import BATCH_SIZE, detect_format, import_products
+
+
+class Command(BaseCommand):
+    help = 'Import products, sizes, colors and images from a CSV or JSONL file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rows written per transaction')
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or detect_format(options['path'])
+
+        def progress(result):
+            self.stdout.write(f'  {result.summary()}')
+
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                result = import_products(stream, file_format, options['batch_size'], progress)
+        except OSError as exc:
+            raise CommandError(exc)
+
+        for error in result.errors:
+            self.stderr.write(f"line {error['line']} [{error['sku']}]: {error['message']}")
+        if result.error_count > len(result.errors):
+            self.stderr.write(f'{result.error_count - len(result.errors)} more errors not shown')
+        style = self.style.WARNING if result.errors else self.style.SUCCESS
+        self.stdout.write(style(result.summary()))
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.product.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product sales rollup from order history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Order items read per chunk')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        total = rebuild_stats(batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stats for {total} products in {elapsed:.2f}s'))
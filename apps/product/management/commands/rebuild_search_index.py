@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.product.search import rebuild_index, uses_postgres
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product search index in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Products indexed per batch')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        total = rebuild_index(batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        backend = 'tsvector' if uses_postgres() else 'inverted index'
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {total} products ({backend}) in {elapsed:.2f}s'
+        ))
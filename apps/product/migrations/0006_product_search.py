@@ -0,0 +1,80 @@
+# Generated by Django 5.2.3 on 2026-10-17 02:19
+
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+SEARCH_VECTOR_INDEX = GinIndex(fields=['search_vector'], name='product_search_vector_gin')
+BACKFILL_BATCH_SIZE = 500
+
+
+def add_search_vector_index(apps, schema_editor):
+    # GIN indexes only exist on Postgres; other databases use SearchIndexEntry
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('product', 'Product'), SEARCH_VECTOR_INDEX)
+
+
+def remove_search_vector_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('product', 'Product'), SEARCH_VECTOR_INDEX)
+
+
+def backfill_search_vectors(apps, schema_editor):
+    # Frozen copy of apps.product.search.document_vector, so searches work right after deploy
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Product = apps.get_model('product', 'Product')
+    Category = apps.get_model('product', 'Category')
+    category_name = Coalesce(
+        Subquery(Category.objects.filter(pk=OuterRef('category_id')).values('name')[:1]),
+        Value(''),
+    )
+    vector = (
+        SearchVector('name', weight='A', config='english')
+        + SearchVector(category_name, weight='B', config='english')
+        + SearchVector('short_description', weight='C', config='english')
+        + SearchVector('description', weight='D', config='english')
+    )
+    last_pk = 0
+    while True:
+        batch = list(
+            Product.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:BACKFILL_BATCH_SIZE]
+        )
+        if not batch:
+            break
+        Product.objects.filter(pk__in=batch).update(search_vector=vector)
+        last_pk = batch[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0005_remove_category_icon'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='SearchIndexEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_entries', to='product.product')),
+            ],
+            options={
+                'unique_together': {('term', 'product')},
+            },
+        ),
+        migrations.RunPython(add_search_vector_index, remove_search_vector_index),
+        migrations.RunPython(backfill_search_vectors, migrations.RunPython.noop),
+    ]
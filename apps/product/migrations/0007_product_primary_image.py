@@ -0,0 +1,49 @@
+# Generated by Django 5.2.3 on 2026-10-17 02:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_primary_images(apps, schema_editor):
+    Image = apps.get_model('product', 'Image')
+    Product = apps.get_model('product', 'Product')
+    primaries = {}
+    duplicates = []
+    # Keep the newest primary image per product so the unique constraint can be added
+    for image in Image.objects.filter(is_primary=True).order_by('-pk').iterator():
+        if image.product_id in primaries:
+            duplicates.append(image.pk)
+        else:
+            primaries[image.product_id] = image
+    if duplicates:
+        Image.objects.filter(pk__in=duplicates).update(is_primary=False)
+    for product_id, image in primaries.items():
+        Product.objects.filter(pk=product_id).update(
+            primary_image=image,
+            primary_image_url=image.image.url if image.image else '',
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0006_product_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='primary_image',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='product.image'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='primary_image_url',
+            field=models.URLField(blank=True, editable=False, max_length=500),
+        ),
+        migrations.RunPython(backfill_primary_images, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='image',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_primary', True)), fields=('product',), name='unique_primary_image_per_product'),
+        ),
+    ]
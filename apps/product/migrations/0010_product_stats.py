@@ -0,0 +1,70 @@
+# Generated by Django 5.2.3 on 2026-10-17 02:24
+
+from datetime import datetime, timezone
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copies of apps.product.stats.DECAY_HALF_LIFE_DAYS and DECAY_EPOCH
+DECAY_HALF_LIFE_DAYS = 30
+DECAY_EPOCH = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def backfill_stats(apps, schema_editor):
+    # Popularity lists read the rollup, so fill it from existing orders
+    OrderItem = apps.get_model('order', 'OrderItem')
+    ProductStats = apps.get_model('product', 'ProductStats')
+    totals = {}
+    items = (
+        OrderItem.objects.exclude(order__status='cancelled')
+        .values_list('product_id', 'order_id', 'quantity', 'order__created_at')
+        .iterator(chunk_size=2000)
+    )
+    for product_id, order_id, quantity, created_at in items:
+        row = totals.setdefault(product_id, {'units_sold': 0, 'orders': set(), 'last_sold_at': None, 'score': 0.0})
+        row['units_sold'] += quantity
+        row['orders'].add(order_id)
+        elapsed = (created_at - DECAY_EPOCH).total_seconds()
+        row['score'] += quantity * 2 ** (elapsed / (DECAY_HALF_LIFE_DAYS * 86400))
+        if row['last_sold_at'] is None or created_at > row['last_sold_at']:
+            row['last_sold_at'] = created_at
+
+    ProductStats.objects.bulk_create(
+        [
+            ProductStats(
+                product_id=product_id,
+                units_sold=row['units_sold'],
+                order_count=len(row['orders']),
+                last_sold_at=row['last_sold_at'],
+                score=row['score'],
+            )
+            for product_id, row in totals.items()
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0009_product_relations'),
+        ('order', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductStats',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='product.product')),
+                ('units_sold', models.PositiveIntegerField(default=0)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('last_sold_at', models.DateTimeField(blank=True, null=True)),
+                ('score', models.FloatField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Product stats',
+                'indexes': [models.Index(fields=['-score'], name='product_stats_score_idx'), models.Index(fields=['-units_sold'], name='product_stats_units_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
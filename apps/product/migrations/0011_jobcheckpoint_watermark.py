@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-17 04:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0010_product_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobcheckpoint',
+            name='watermark',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,11 +1,12 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
-from django.utils.text import slugify
 from django.urls import reverse
+from django.contrib.postgres.search import SearchVectorField
 from cloudinary.models import CloudinaryField
 from cloudinary import uploader
 from PIL import Image as PilImage
 from io import BytesIO
+from .slugs import allocate_slug
 
 
 class Category(models.Model):
@@ -22,15 +23,7 @@ class Category(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.slug:
-            base_slug = slugify(self.name)
-            slug = base_slug
-            counter = 1
-
-            while Category.objects.filter(slug=slug).exclude(id=self.id).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-
-            self.slug = slug
+            self.slug = allocate_slug(Category, self.name, self)
 
         super().save(*args, **kwargs)
 
@@ -61,21 +54,33 @@ class Product(models.Model):
     is_featured = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by apps.product.search; GIN indexed on Postgres (see migration 0006)
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Denormalized from Image.is_primary so listings never query images
+    primary_image = models.ForeignKey(
+        'Image',
+        on_delete=models.SET_NULL,
+        related_name='+',
+        null=True,
+        blank=True,
+        editable=False
+    )
+    primary_image_url = models.URLField(max_length=500, blank=True, editable=False)
+
+    class Meta:
+        # Keyset pagination indexes for each listing sort, id is the tie-breaker
+        indexes = [
+            models.Index(fields=['is_active', 'name', 'id'], name='product_active_name_idx'),
+            models.Index(fields=['is_active', 'price', 'id'], name='product_active_price_idx'),
+            models.Index(fields=['is_active', 'created_at', 'id'], name='product_active_created_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
     def save(self, *args, **kwargs):
         if not self.slug:
-            base_slug = slugify(self.name)
-            slug = base_slug
-            counter = 1
-
-            while Product.objects.filter(slug=slug).exclude(id=self.id).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-
-            self.slug = slug
+            self.slug = allocate_slug(Product, self.name, self)
 
         super().save(*args, **kwargs)
 
@@ -89,11 +94,10 @@ class Product(models.Model):
         return self.is_active and self.stock_quantity >= quantity
 
     def get_primary_image(self):
-        return self.images.filter(is_primary=True).first()
+        return self.primary_image
 
     def get_primary_image_url(self):
-        primary = self.get_primary_image()
-        return primary.image.url if primary else None
+        return self.primary_image_url or None
 
     def get_all_images(self):
         return self.images.all()
@@ -138,17 +142,106 @@ class Image(models.Model):
     alt_text = models.CharField(max_length=200, blank=True)
     is_primary = models.BooleanField(default=False)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product'],
+                condition=models.Q(is_primary=True),
+                name='unique_primary_image_per_product'
+            ),
+        ]
+
     def __str__(self):
         return f"{self.product.name} - Image"
 
     def save(self, *args, **kwargs):
-        # Ensure only one primary image per product
-        if self.is_primary:
-            Image.objects.filter(
-                product=self.product,
-                is_primary=True
-            ).exclude(id=self.id).update(is_primary=False)
+        product = self.product
+        with transaction.atomic():
+            # Only one primary image per product: demote the one tracked on the product
+            if self.is_primary and product.primary_image_id not in (None, self.pk):
+                Image.objects.filter(pk=product.primary_image_id).update(is_primary=False)
 
-        super().save(*args, **kwargs)
+            super().save(*args, **kwargs)
+
+            if self.is_primary:
+                self._set_product_primary(self, self.get_image_url())
+            elif product.primary_image_id == self.pk:
+                self._set_product_primary(None, '')
+
+    def get_image_url(self):
+        if not self.image:
+            return ''
+        return self._meta.get_field('image').to_python(self.image).url
+
+    def _set_product_primary(self, image, url):
+        """Update the denormalized primary image on the product row and instance"""
+        Product.objects.filter(pk=self.product_id).update(primary_image=image, primary_image_url=url)
+        self.product.primary_image = image
+        self.product.primary_image_url = url
+
+
+class SearchIndexEntry(models.Model):
+    """Inverted index row used for product search on databases without full-text search"""
+    term = models.CharField(max_length=64)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_entries')
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        unique_together = ('term', 'product')
 
+    def __str__(self):
+        return f"{self.term} -> {self.product_id}"
+
+
+class ProductStats(models.Model):
+    """Sales rollup per product, maintained by apps.product.stats"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    units_sold = models.PositiveIntegerField(default=0)
+    order_count = models.PositiveIntegerField(default=0)
+    last_sold_at = models.DateTimeField(null=True, blank=True)
+    # Forward-decayed units sold; ordering by it ranks recent sales higher
+    score = models.FloatField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Product stats"
+        indexes = [
+            models.Index(fields=['-score'], name='product_stats_score_idx'),
+            models.Index(fields=['-units_sold'], name='product_stats_units_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.units_sold} sold"
+
+
+class ProductRelation(models.Model):
+    """Precomputed related product, built by apps.product.related"""
+    SOURCE_CHOICES = [
+        ('orders', 'Bought together'),
+        ('category', 'Same category'),
+    ]
 
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='relations')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_from')
+    score = models.PositiveIntegerField(default=0)
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default='orders')
+
+    class Meta:
+        unique_together = ('product', 'related')
+        indexes = [
+            models.Index(fields=['product', '-score'], name='product_relation_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} ({self.score})"
+
+
+class JobCheckpoint(models.Model):
+    """Progress marker for incremental offline jobs"""
+    name = models.CharField(max_length=100, unique=True)
+    position = models.BigIntegerField(default=0)
+    # Everything up to this time has been processed
+    watermark = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.watermark or self.position}"
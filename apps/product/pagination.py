@@ -0,0 +1,152 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+CURSOR_SALT = 'apps.product.cursor'
+
+
+def cursor_ordering(queryset):
+    """Keyset ordering for a queryset, with the primary key as tie-breaker.
+
+    Returns None when the queryset is ordered by something that is not a
+    plain model field (e.g. a search rank annotation).
+    """
+    opts = queryset.model._meta
+    ordering = []
+    for item in queryset.query.order_by:
+        if not isinstance(item, str):
+            return None
+        name = item.lstrip('-')
+        if name in ('pk', opts.pk.name):
+            break
+        try:
+            field = opts.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if field.null or field.is_relation:
+            return None
+        ordering.append(item)
+    if not ordering:
+        return None
+    descending = ordering[-1].startswith('-')
+    ordering.append(f"{'-' if descending else ''}{opts.pk.name}")
+    return ordering
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class CursorPage:
+    """A page of keyset-paginated results"""
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return self.paginator.encode_cursor(self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        return self.paginator.encode_cursor(self.object_list[0], reverse=True)
+
+
+class CursorPaginator:
+    """Keyset paginator: every page is a range scan, no OFFSET and no COUNT(*)"""
+
+    def __init__(self, queryset, per_page, ordering=None):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = ordering or cursor_ordering(queryset)
+        if self.ordering is None:
+            raise ValueError('Queryset ordering does not support cursor pagination.')
+        self.fields = [
+            queryset.model._meta.get_field(item.lstrip('-')) for item in self.ordering
+        ]
+
+    def encode_cursor(self, obj, reverse=False):
+        """Opaque, signed token pointing just after (or before) obj"""
+        values = [_encode_value(getattr(obj, field.attname)) for field in self.fields]
+        return signing.dumps({'k': values, 'r': int(reverse)}, salt=CURSOR_SALT, compress=True)
+
+    def decode_cursor(self, cursor):
+        """Return (key values, reverse) or None for a missing or tampered cursor"""
+        if not cursor:
+            return None
+        try:
+            payload = signing.loads(cursor, salt=CURSOR_SALT)
+            values = payload['k']
+            if len(values) != len(self.fields):
+                return None
+            return [field.to_python(value) for field, value in zip(self.fields, values)], bool(payload['r'])
+        except (signing.BadSignature, KeyError, TypeError, ValueError, ValidationError):
+            return None
+
+    def _keyset_filter(self, values, reverse):
+        """Rows strictly after the key (before it when reverse)"""
+        condition = Q()
+        for i, item in enumerate(self.ordering):
+            descending = item.startswith('-') != reverse
+            lookup = 'lt' if descending else 'gt'
+            term = Q(**{f'{self.fields[i].name}__{lookup}': values[i]})
+            for field, value in zip(self.fields[:i], values[:i]):
+                term &= Q(**{field.name: value})
+            condition |= term
+        return condition
+
+    def get_page(self, cursor=None):
+        decoded = self.decode_cursor(cursor)
+        if decoded is None:
+            rows = list(self.queryset.order_by(*self.ordering)[:self.per_page + 1])
+            return CursorPage(rows[:self.per_page], self, len(rows) > self.per_page, False)
+
+        values, reverse = decoded
+        if reverse:
+            flipped = [item[1:] if item.startswith('-') else f'-{item}' for item in self.ordering]
+            rows = list(
+                self.queryset.filter(self._keyset_filter(values, True))
+                .order_by(*flipped)[:self.per_page + 1]
+            )
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            return CursorPage(rows, self, True, has_previous)
+
+        rows = list(
+            self.queryset.filter(self._keyset_filter(values, False))
+            .order_by(*self.ordering)[:self.per_page + 1]
+        )
+        return CursorPage(rows[:self.per_page], self, len(rows) > self.per_page, True)
@@ -0,0 +1,187 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import permutations
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import JobCheckpoint, Product, ProductRelation
+
+CHECKPOINT_NAME = 'related_products'
+RELATED_LIMIT = 4
+# Larger baskets add little signal and make the pair count quadratic
+MAX_BASKET_SIZE = 50
+# Orders are only counted once this old, by then every checkout transaction
+# that stamped an earlier created_at has committed
+SETTLE_DELAY = timedelta(minutes=10)
+
+
+def get_related_products(product, limit=RELATED_LIMIT):
+    """Related products from the precomputed table, same category as fallback"""
+    related = list(
+        Product.objects.filter(related_from__product=product, is_active=True)
+        .order_by('-related_from__score', 'related_from__id')[:limit]
+    )
+    if related or product.category_id is None:
+        return related
+    # Table not built for this product yet
+    return list(
+        Product.objects.filter(category_id=product.category_id, is_active=True)
+        .exclude(id=product.id)[:limit]
+    )
+
+
+def count_pairs(baskets):
+    """Co-occurrence counts for (product, related) pairs across baskets"""
+    pairs = Counter()
+    for products in baskets.values():
+        products = sorted(products)[:MAX_BASKET_SIZE]
+        pairs.update(permutations(products, 2))
+    return pairs
+
+
+def apply_pair_counts(pairs, sign=1):
+    """Add (sign=1) or remove (sign=-1) pair counts on the relation table"""
+    if not pairs:
+        return 0
+    product_ids = {product_id for product_id, _ in pairs}
+    existing = {
+        (relation.product_id, relation.related_id): relation
+        for relation in ProductRelation.objects.filter(product_id__in=product_ids)
+    }
+    to_update = []
+    to_create = []
+    to_delete = []
+    for (product_id, related_id), count in pairs.items():
+        relation = existing.get((product_id, related_id))
+        if sign < 0:
+            if relation is None or relation.source != 'orders':
+                continue
+            relation.score -= count
+            (to_update if relation.score > 0 else to_delete).append(relation)
+            continue
+        if relation is None:
+            to_create.append(ProductRelation(
+                product_id=product_id, related_id=related_id, score=count, source='orders'
+            ))
+            continue
+        relation.score = (relation.score if relation.source == 'orders' else 0) + count
+        relation.source = 'orders'
+        to_update.append(relation)
+
+    ProductRelation.objects.bulk_update(to_update, ['score', 'source'], batch_size=1000)
+    ProductRelation.objects.bulk_create(to_create, batch_size=1000)
+    ProductRelation.objects.filter(pk__in=[relation.pk for relation in to_delete]).delete()
+    return len(pairs)
+
+
+def fill_category_neighbours(limit=RELATED_LIMIT):
+    """Give cold products (fewer than limit relations) same-category neighbours"""
+    relation_counts = Counter(
+        ProductRelation.objects.values_list('product_id', flat=True).iterator()
+    )
+    existing = defaultdict(set)
+    for product_id, related_id in ProductRelation.objects.values_list('product_id', 'related_id').iterator():
+        existing[product_id].add(related_id)
+
+    by_category = defaultdict(list)
+    for product_id, category_id in (
+        Product.objects.filter(is_active=True, category__isnull=False)
+        .order_by('category_id', '-created_at')
+        .values_list('id', 'category_id')
+        .iterator()
+    ):
+        by_category[category_id].append(product_id)
+
+    to_create = []
+    for product_ids in by_category.values():
+        for product_id in product_ids:
+            missing = limit - relation_counts[product_id]
+            if missing <= 0:
+                continue
+            for neighbour_id in product_ids:
+                if missing <= 0:
+                    break
+                if neighbour_id == product_id or neighbour_id in existing[product_id]:
+                    continue
+                to_create.append(ProductRelation(
+                    product_id=product_id, related_id=neighbour_id, score=0, source='category'
+                ))
+                missing -= 1
+
+    ProductRelation.objects.bulk_create(to_create, batch_size=1000)
+    return len(to_create)
+
+
+def _apply_orders(orders, sign, batch_size):
+    """Count or uncount the baskets of `orders` in primary key batches"""
+    from apps.order.models import OrderItem
+
+    orders_done = pairs_done = 0
+    last_pk = 0
+    while True:
+        order_ids = list(orders.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not order_ids:
+            break
+        baskets = defaultdict(set)
+        for order_id, product_id in OrderItem.objects.filter(order_id__in=order_ids).values_list(
+            'order_id', 'product_id'
+        ).iterator():
+            baskets[order_id].add(product_id)
+        pairs_done += apply_pair_counts(count_pairs(baskets), sign)
+        orders_done += len(order_ids)
+        last_pk = order_ids[-1]
+    return orders_done, pairs_done
+
+
+def build_related_products(full=False, batch_size=1000):
+    """Fold orders placed since the last run into the relation table.
+
+    Runs only cover orders older than SETTLE_DELAY, so every order in the
+    window has committed, whatever order the transactions finished in.
+    Whether an order counts is judged by its cancellation events up to the
+    same cutoff, so an order cancelled after it was counted is subtracted
+    by the run whose window holds the cancellation. With full=True, or on
+    the first run, the table is rebuilt from the whole order history.
+    Returns (orders processed, pairs applied, fallback rows created).
+    """
+    from apps.order.models import Order, OrderStatusEvent
+
+    checkpoint, _ = JobCheckpoint.objects.get_or_create(name=CHECKPOINT_NAME)
+    since = None if full else checkpoint.watermark
+    cutoff = timezone.now() - SETTLE_DELAY
+    if since is not None:
+        cutoff = max(cutoff, since)
+
+    def cancelled(after=None):
+        events = OrderStatusEvent.objects.filter(
+            order=OuterRef('pk'), to_status='cancelled', created_at__lte=cutoff
+        )
+        if after is not None:
+            events = events.filter(created_at__gt=after)
+        return Exists(events)
+
+    # Orders cancelled before status events were recorded have none
+    legacy_cancelled = Q(status='cancelled') & ~Exists(
+        OrderStatusEvent.objects.filter(order=OuterRef('pk'), to_status='cancelled')
+    )
+    counted = Order.objects.filter(created_at__lte=cutoff).exclude(cancelled()).exclude(legacy_cancelled)
+
+    with transaction.atomic():
+        if since is None:
+            ProductRelation.objects.all().delete()
+            orders_done, pairs_done = _apply_orders(counted, 1, batch_size)
+        else:
+            orders_done, pairs_done = _apply_orders(counted.filter(created_at__gt=since), 1, batch_size)
+            uncounted = Order.objects.filter(created_at__lte=since).filter(cancelled(after=since))
+            removed_orders, removed_pairs = _apply_orders(uncounted, -1, batch_size)
+            orders_done += removed_orders
+            pairs_done += removed_pairs
+
+        # Fallback rows are recomputed on every run, order-based rows accumulate
+        ProductRelation.objects.filter(source='category').delete()
+        fallback_done = fill_category_neighbours()
+        checkpoint.watermark = cutoff
+        checkpoint.save(update_fields=['watermark', 'updated_at'])
+    return orders_done, pairs_done, fallback_done
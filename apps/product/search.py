@@ -0,0 +1,164 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils.html import strip_tags
+
+from .models import Category, Product, SearchIndexEntry
+
+# Postgres text search configuration used for both documents and queries
+SEARCH_CONFIG = 'english'
+
+# (field, tsvector weight, inverted index weight) - name matches rank highest
+SEARCH_FIELDS = (
+    ('name', 'A', 8),
+    ('category_name', 'B', 4),
+    ('short_description', 'C', 2),
+    ('description', 'D', 1),
+)
+
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 8
+TOKEN_RE = re.compile(r'\w+')
+
+
+def uses_postgres():
+    """Check if the full-text search backend is available"""
+    return connection.vendor == 'postgresql'
+
+
+def tokenize(text):
+    """Split text into unique lowercase search terms"""
+    terms = []
+    for term in TOKEN_RE.findall(strip_tags(text or '').lower()):
+        term = term[:MAX_TERM_LENGTH]
+        if term not in terms:
+            terms.append(term)
+    return terms
+
+
+def document_vector():
+    """Weighted tsvector expression for a product row"""
+    category_name = Coalesce(
+        Subquery(Category.objects.filter(pk=OuterRef('category_id')).values('name')[:1]),
+        Value(''),
+    )
+    sources = {
+        'name': 'name',
+        'category_name': category_name,
+        'short_description': 'short_description',
+        'description': 'description',
+    }
+    vector = None
+    for field, weight, _ in SEARCH_FIELDS:
+        part = SearchVector(sources[field], weight=weight, config=SEARCH_CONFIG)
+        vector = part if vector is None else vector + part
+    return vector
+
+
+def build_index_entries(product):
+    """Build inverted index rows for a product"""
+    values = {
+        'name': product.name,
+        'category_name': product.category.name if product.category else '',
+        'short_description': product.short_description,
+        'description': product.description,
+    }
+    weights = {}
+    for field, _, weight in SEARCH_FIELDS:
+        for term in tokenize(values[field]):
+            weights[term] = weights.get(term, 0) + weight
+    return [
+        SearchIndexEntry(term=term, product_id=product.pk, weight=weight)
+        for term, weight in weights.items()
+    ]
+
+
+def index_products(product_ids):
+    """Refresh the search document of the given products"""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return 0
+
+    if uses_postgres():
+        return Product.objects.filter(pk__in=product_ids).update(search_vector=document_vector())
+
+    products = Product.objects.filter(pk__in=product_ids).select_related('category').only(
+        'name', 'short_description', 'description', 'category__name'
+    )
+    entries = []
+    for product in products:
+        entries.extend(build_index_entries(product))
+
+    with transaction.atomic():
+        SearchIndexEntry.objects.filter(product_id__in=product_ids).delete()
+        SearchIndexEntry.objects.bulk_create(entries, batch_size=1000)
+    return len(product_ids)
+
+
+def rebuild_index(batch_size=500):
+    """Rebuild the search index for all products, one batch at a time"""
+    total = 0
+    last_pk = 0
+    while True:
+        batch = list(
+            Product.objects.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not batch:
+            break
+        index_products(batch)
+        total += len(batch)
+        last_pk = batch[-1]
+    return total
+
+
+def _query_terms(query):
+    return tokenize(query)[:MAX_QUERY_TERMS]
+
+
+def _tsquery(terms):
+    # Terms only contain word characters, so they are safe to use in a raw tsquery
+    return SearchQuery(
+        ' & '.join(f'{term}:*' for term in terms),
+        search_type='raw',
+        config=SEARCH_CONFIG,
+    )
+
+
+def filter_matching(queryset, query):
+    """Filter queryset to products matching every query term"""
+    terms = _query_terms(query)
+    if not terms:
+        return queryset
+    if uses_postgres():
+        return queryset.filter(search_vector=_tsquery(terms))
+    return queryset.filter(*[
+        Exists(SearchIndexEntry.objects.filter(product=OuterRef('pk'), term__startswith=term))
+        for term in terms
+    ])
+
+
+def search_products(queryset, query):
+    """Filter queryset to products matching every query term, annotated with search_rank"""
+    terms = _query_terms(query)
+    if not terms:
+        return queryset.annotate(search_rank=Value(0))
+
+    queryset = filter_matching(queryset, query)
+    if uses_postgres():
+        return queryset.annotate(search_rank=SearchRank(F('search_vector'), _tsquery(terms)))
+
+    any_term = Q()
+    for term in terms:
+        any_term |= Q(term__startswith=term)
+    rank = (
+        SearchIndexEntry.objects.filter(any_term, product=OuterRef('pk'))
+        .values('product')
+        .annotate(total=Sum('weight'))
+        .values('total')
+    )
+    return queryset.annotate(search_rank=Coalesce(Subquery(rank), 0))
@@ -0,0 +1,79 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import bump_catalogue_version, bump_product_versions
+from .models import Category, Color, Image, Product, Size
+from .search import index_products
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_catalogue_caches(sender, raw=False, **kwargs):
+    """Cached counts and facets are keyed on the catalogue version.
+
+    Bumped on commit: a bump inside the transaction would let a concurrent
+    request cache the old rows under the new version.
+    """
+    if raw:
+        return
+    transaction.on_commit(bump_catalogue_version)
+
+
+@receiver(post_save, sender=Product)
+def update_product_search_document(sender, instance, raw=False, **kwargs):
+    """Keep the search document in sync with the saved product"""
+    if raw:
+        return
+    index_products([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def update_category_search_documents(sender, instance, created=False, raw=False, **kwargs):
+    """Category names are part of the product search document"""
+    if raw or created:
+        return
+    index_products(instance.products.values_list('pk', flat=True))
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_fragments(sender, instance, raw=False, **kwargs):
+    """Saves limited by update_fields may leave updated_at untouched"""
+    if raw:
+        return
+    product_ids = [instance.pk]
+    transaction.on_commit(lambda: bump_product_versions(product_ids))
+
+
+@receiver([post_save, post_delete], sender=Size)
+@receiver([post_save, post_delete], sender=Color)
+@receiver([post_save, post_delete], sender=Image)
+def invalidate_variant_fragments(sender, instance, raw=False, **kwargs):
+    """Variant rows are rendered in the product's cached fragments"""
+    if raw:
+        return
+    product_ids = [instance.product_id]
+    transaction.on_commit(lambda: bump_product_versions(product_ids))
+
+
+@receiver(post_delete, sender=Image)
+def clear_deleted_primary_image(sender, instance, **kwargs):
+    """Queryset and cascade deletes skip Image methods, so clear the denormalized URL here.
+
+    The primary_image foreign key is already nulled by SET_NULL at this point.
+    """
+    Product.objects.filter(
+        pk=instance.product_id, primary_image__isnull=True
+    ).exclude(primary_image_url='').update(primary_image_url='')
+    if Image.product.is_cached(instance) and instance.product.primary_image_id in (None, instance.pk):
+        instance.product.primary_image = None
+        instance.product.primary_image_url = ''
+
+
+@receiver(post_save, sender=Category)
+def invalidate_category_product_fragments(sender, instance, created=False, raw=False, **kwargs):
+    """The category name is rendered on the product detail page"""
+    if raw or created:
+        return
+    product_ids = list(instance.products.values_list('pk', flat=True))
+    transaction.on_commit(lambda: bump_product_versions(product_ids))
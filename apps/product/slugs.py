@@ -0,0 +1,80 @@
+import re
+from collections import defaultdict
+
+from django.db.models import Q
+from django.utils.text import slugify
+
+# Bases per prefix query when allocating slugs in bulk
+PREFIX_BATCH_SIZE = 100
+SUFFIX_RE = re.compile(r'^(?P<base>.+)-(?P<number>\d+)$')
+
+
+def _base_slug(model, value, field_name):
+    max_length = model._meta.get_field(field_name).max_length
+    base = slugify(value) or model._meta.model_name
+    # Leave room for a "-<n>" suffix
+    return base[:max_length - 8].strip('-') or model._meta.model_name
+
+
+class _SlugPool:
+    """Slugs already taken, indexed by base so the next free suffix is cheap to find"""
+
+    def __init__(self, bases, taken):
+        self.taken = set(taken)
+        self.used = defaultdict(set)
+        self.next_number = defaultdict(int)
+        for slug in self.taken:
+            if slug in bases:
+                self.used[slug].add(0)
+            match = SUFFIX_RE.match(slug)
+            if match and match.group('base') in bases:
+                self.used[match.group('base')].add(int(match.group('number')))
+
+    def allocate(self, base):
+        number = self.next_number[base]
+        while True:
+            slug = f"{base}-{number}" if number else base
+            if number not in self.used[base] and slug not in self.taken:
+                break
+            number += 1
+        self.used[base].add(number)
+        self.taken.add(slug)
+        self.next_number[base] = number + 1
+        return slug
+
+
+def allocate_slug(model, value, instance=None, field_name='slug'):
+    """Free slug for value, found with a single prefix query"""
+    base = _base_slug(model, value, field_name)
+    queryset = model._default_manager.filter(**{f'{field_name}__startswith': base})
+    if instance is not None and instance.pk is not None:
+        queryset = queryset.exclude(pk=instance.pk)
+    pool = _SlugPool({base}, queryset.values_list(field_name, flat=True))
+    return pool.allocate(base)
+
+
+def assign_slugs(objs, source='name', field_name='slug'):
+    """Give unsaved objects unique slugs in bulk so they can go through bulk_create"""
+    pending = [obj for obj in objs if not getattr(obj, field_name)]
+    if not pending:
+        return objs
+    model = type(pending[0])
+
+    by_base = defaultdict(list)
+    for obj in pending:
+        by_base[_base_slug(model, getattr(obj, source), field_name)].append(obj)
+
+    # Slugs already set on objects in this batch are taken too
+    taken = {getattr(obj, field_name) for obj in objs if getattr(obj, field_name)}
+    bases = list(by_base)
+    for i in range(0, len(bases), PREFIX_BATCH_SIZE):
+        prefix_q = Q()
+        for base in bases[i:i + PREFIX_BATCH_SIZE]:
+            prefix_q |= Q(**{f'{field_name}__startswith': base})
+        taken.update(model._default_manager.filter(prefix_q).values_list(field_name, flat=True))
+
+    pool = _SlugPool(set(bases), taken)
+    for base, group in by_base.items():
+        for obj in group:
+            setattr(obj, field_name, pool.allocate(base))
+    return objs
@@ -0,0 +1,101 @@
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Case, F, FloatField, IntegerField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import ProductStats
+
+# Popularity halves every DECAY_HALF_LIFE_DAYS. Weights grow from a fixed epoch
+# instead of decaying old rows, so a sale never requires touching other rows.
+DECAY_HALF_LIFE_DAYS = 30
+DECAY_EPOCH = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def decay_weight(when):
+    """Forward-decay weight of a sale made at `when`"""
+    elapsed = (when - DECAY_EPOCH).total_seconds()
+    return 2 ** (elapsed / (DECAY_HALF_LIFE_DAYS * 86400))
+
+
+def _group_lines(lines):
+    """Sum (product_id, quantity) lines per product"""
+    quantities = defaultdict(int)
+    for product_id, quantity in lines:
+        quantities[product_id] += quantity
+    return quantities
+
+
+def _apply(quantities, sign, sold_at, touch_last_sold):
+    if not quantities:
+        return 0
+    weight = decay_weight(sold_at)
+    units = Case(
+        *[When(product_id=pk, then=Value(qty)) for pk, qty in quantities.items()],
+        output_field=IntegerField(),
+    )
+    score = Case(
+        *[When(product_id=pk, then=Value(qty * weight)) for pk, qty in quantities.items()],
+        output_field=FloatField(),
+    )
+    updates = {
+        'units_sold': Greatest(F('units_sold') + sign * units, 0),
+        'order_count': Greatest(F('order_count') + sign, 0),
+        'score': Greatest(F('score') + sign * score, 0.0),
+    }
+    if touch_last_sold:
+        updates['last_sold_at'] = sold_at
+    return ProductStats.objects.filter(product_id__in=quantities).update(**updates)
+
+
+def record_sales(lines, sold_at=None):
+    """Add one order's (product_id, quantity) lines to the rollup in a single UPDATE"""
+    quantities = _group_lines(lines)
+    sold_at = sold_at or timezone.now()
+    with transaction.atomic():
+        ProductStats.objects.bulk_create(
+            [ProductStats(product_id=pk) for pk in quantities],
+            ignore_conflicts=True,
+        )
+        return _apply(quantities, 1, sold_at, touch_last_sold=True)
+
+
+def reverse_sales(lines, sold_at):
+    """Remove a cancelled order's lines from the rollup"""
+    return _apply(_group_lines(lines), -1, sold_at, touch_last_sold=False)
+
+
+def rebuild_stats(batch_size=2000):
+    """Recompute the rollup from order history"""
+    from apps.order.models import OrderItem
+
+    totals = defaultdict(lambda: {'units_sold': 0, 'orders': set(), 'last_sold_at': None, 'score': 0.0})
+    items = (
+        OrderItem.objects.exclude(order__status='cancelled')
+        .values_list('product_id', 'order_id', 'quantity', 'order__created_at')
+        .iterator(chunk_size=batch_size)
+    )
+    for product_id, order_id, quantity, created_at in items:
+        row = totals[product_id]
+        row['units_sold'] += quantity
+        row['orders'].add(order_id)
+        row['score'] += quantity * decay_weight(created_at)
+        if row['last_sold_at'] is None or created_at > row['last_sold_at']:
+            row['last_sold_at'] = created_at
+
+    stats = [
+        ProductStats(
+            product_id=product_id,
+            units_sold=row['units_sold'],
+            order_count=len(row['orders']),
+            last_sold_at=row['last_sold_at'],
+            score=row['score'],
+        )
+        for product_id, row in totals.items()
+    ]
+    with transaction.atomic():
+        ProductStats.objects.all().delete()
+        ProductStats.objects.bulk_create(stats, batch_size=batch_size)
+    return len(stats)
@@ -1,3 +1,619 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlencode
+
+from .loaders import product_detail_context, product_detail_queryset
+from .models import Category, Color, Image, Product, ProductRelation, Size
+
+
+class ProductDetailQueryBudgetTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Shirts')
+        cls.product = Product.objects.create(
+            name='Linen shirt', category=category, price='40.00', sku='SHIRT-1', stock_quantity=5
+        )
+        for name in ('S', 'M', 'L'):
+            Size.objects.create(product=cls.product, name=name)
+        Color.objects.create(product=cls.product, name='White', hex_code='#ffffff')
+        Color.objects.create(product=cls.product, name='Navy', hex_code='#000080')
+        Image.objects.create(product=cls.product, image='products/shirt-front', is_primary=True)
+        Image.objects.create(product=cls.product, image='products/shirt-back')
+        for i in range(3):
+            related = Product.objects.create(
+                name=f'Related {i}', category=category, price='10.00', sku=f'REL-{i}', stock_quantity=1
+            )
+            ProductRelation.objects.create(product=cls.product, related=related, score=3 - i)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_loader_query_budget(self):
+        # product + category, sizes, colors, images, related products
+        with self.assertNumQueries(5):
+            product = product_detail_queryset().get(slug=self.product.slug)
+            context = product_detail_context(product)
+            detail = context['detail']
+            self.assertEqual([size.name for size in detail.sizes], ['S', 'M', 'L'])
+            self.assertEqual(len(detail.colors), 2)
+            self.assertEqual(len(detail.images), 2)
+            self.assertEqual(len(detail.related_products), 3)
+        self.assertTrue(context['primary_image_url'])
+
+    def test_template_does_not_query_variants(self):
+        url = reverse('product_detail', args=[self.product.slug])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, secure=True)
+        self.assertEqual(response.status_code, 200)
+        for table in ('product_size', 'product_color', 'product_image'):
+            hits = [q['sql'] for q in queries if f'FROM "{table}"' in q['sql']]
+            self.assertEqual(len(hits), 1, f'{table} queried {len(hits)} times')
+
+    def test_cached_fragments_skip_variant_queries(self):
+        url = reverse('product_detail', args=[self.product.slug])
+        self.client.get(url, secure=True)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, secure=True)
+        self.assertContains(response, 'Navy')
+        for table in ('product_size', 'product_color', 'product_image'):
+            self.assertFalse([q for q in queries if f'FROM "{table}"' in q['sql']])
+
+
+class ProductFragmentCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(name='Cap', price='12.00', sku='CAP-1', stock_quantity=3)
+        self.url = reverse('product_detail', args=[self.product.slug])
+
+    def test_variant_change_invalidates_detail(self):
+        self.client.get(self.url, secure=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            Size.objects.create(product=self.product, name='XL')
+        self.assertContains(self.client.get(self.url, secure=True), 'Select size XL')
+
+    def test_stock_edit_invalidates_card(self):
+        from main.templatetags.nix import product_card
+
+        self.assertIn('In Stock', product_card(self.product))
+        self.product.stock_quantity = 0
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save(update_fields=['stock_quantity'])
+        self.assertIn('Out of Stock', product_card(self.product))
+
+
+class ConditionalGetTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(name='Bib', price='8.00', sku='BIB-1', stock_quantity=4)
+        self.url = reverse('product_detail', args=[self.product.slug])
+
+    def test_anonymous_revalidation(self):
+        response = self.client.get(self.url, secure=True)
+        self.assertIn('public', response['Cache-Control'])
+        response = self.client.get(self.url, secure=True, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_not_modified_skips_rendering(self):
+        from main.models import User
+
+        self.client.force_login(User.objects.create_user('shopper', 'shopper@example.com', 'pw'))
+        response = self.client.get(reverse('products'), secure=True)
+        self.assertIn('private', response['Cache-Control'])
+        response = self.client.get(
+            reverse('products'), secure=True,
+            HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(response.templates)
+
+    def test_date_only_revalidation_is_never_answered_with_304(self):
+        response = self.client.get(self.url, secure=True)
+        self.assertNotIn('Last-Modified', response)
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=0)
+        response = self.client.get(self.url, secure=True, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+
+    def test_edit_changes_etag(self):
+        etag = self.client.get(self.url, secure=True)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Size.objects.create(product=self.product, name='One size')
+        response = self.client.get(self.url, secure=True, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class ProductSearchTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        shoes = Category.objects.create(name='Shoes')
+        cls.runner = Product.objects.create(
+            name='Trail runner', category=shoes, price='60.00', sku='RUN-1', stock_quantity=2,
+            description='Light shoe for running',
+        )
+        cls.boot = Product.objects.create(
+            name='Winter boot', category=shoes, price='80.00', sku='BOOT-1', stock_quantity=2,
+            short_description='Warm boot for running errands',
+        )
+        Product.objects.create(name='Wool hat', price='15.00', sku='HAT-1', stock_quantity=2)
+
+    def search(self, query):
+        from .search import search_products
+
+        return list(search_products(Product.objects.all(), query).order_by('-search_rank', 'pk'))
+
+    def test_matches_every_term_by_prefix(self):
+        self.assertEqual(self.search('shoe'), [self.runner, self.boot])
+        self.assertEqual(self.search('run boot'), [self.boot])
+        self.assertEqual(self.search('sandal'), [])
+
+    def test_weightier_fields_rank_first(self):
+        self.assertEqual(self.search('running')[:1], [self.boot])
+        self.assertEqual(self.search('runner'), [self.runner])
+
+    def test_index_follows_edits(self):
+        from .search import index_products
+
+        Product.objects.filter(pk=self.runner.pk).update(name='Trail sandal')
+        self.assertEqual(self.search('sandal'), [])
+        self.assertEqual(index_products([self.runner.pk]), 1)
+        self.assertEqual(self.search('sandal'), [self.runner])
+        self.assertEqual(self.search('runner'), [])
+
+
+class PrimaryImageTest(TestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(name='Dress', price='30.00', sku='DRESS-1', stock_quantity=2)
+
+    def primary(self):
+        product = Product.objects.get(pk=self.product.pk)
+        return product.primary_image_id, product.primary_image_url
+
+    def test_promote_and_replace(self):
+        front = Image.objects.create(product=self.product, image='products/front', is_primary=True)
+        self.assertEqual(self.primary(), (front.pk, front.get_image_url()))
+
+        back = Image.objects.create(product=self.product, image='products/back')
+        self.assertEqual(self.primary()[0], front.pk)
+        back.is_primary = True
+        back.save()
+        self.assertEqual(self.primary(), (back.pk, back.get_image_url()))
+        self.assertFalse(Image.objects.get(pk=front.pk).is_primary)
+
+        back.is_primary = False
+        back.save()
+        self.assertEqual(self.primary(), (None, ''))
+
+    def test_instance_delete_clears_primary(self):
+        image = Image.objects.create(product=self.product, image='products/front', is_primary=True)
+        image.delete()
+        self.assertEqual(self.primary(), (None, ''))
+        self.assertEqual(image.product.primary_image_url, '')
+
+    def test_queryset_delete_clears_primary(self):
+        Image.objects.create(product=self.product, image='products/front', is_primary=True)
+        other = Image.objects.create(product=self.product, image='products/back')
+        Image.objects.filter(product=self.product, is_primary=True).delete()
+        self.assertEqual(self.primary(), (None, ''))
+
+        other.is_primary = True
+        other.save()
+        Image.objects.filter(pk=Image.objects.create(product=self.product, image='products/side').pk).delete()
+        self.assertEqual(self.primary(), (other.pk, other.get_image_url()))
+
+
+class CursorPaginatorTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Repeated prices exercise the id tie-breaker
+        for i in range(7):
+            Product.objects.create(name=f'Item {i}', price=f'{10 + i % 3}.00', sku=f'ITEM-{i}', stock_quantity=1)
+
+    def walk(self, queryset, per_page=3):
+        from .pagination import CursorPaginator
+
+        paginator = CursorPaginator(queryset, per_page)
+        pages = [paginator.get_page()]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        forward = [[product.pk for product in page] for page in pages]
+
+        backward = [forward[-1]]
+        page = pages[-1]
+        while page.has_previous():
+            page = paginator.get_page(page.previous_cursor)
+            backward.insert(0, [product.pk for product in page])
+        return forward, backward
+
+    def test_forward_and_backward_match_offset_order(self):
+        products = Product.objects.filter(is_active=True)
+        for ordering in (['name'], ['price'], ['-price'], ['-created_at']):
+            queryset = products.order_by(*ordering)
+            tie_breaker = '-id' if ordering[0].startswith('-') else 'id'
+            expected = list(queryset.order_by(*ordering, tie_breaker).values_list('pk', flat=True))
+            forward, backward = self.walk(queryset)
+            self.assertEqual([len(page) for page in forward], [3, 3, 1], ordering)
+            self.assertEqual(sum(forward, []), expected, ordering)
+            self.assertEqual(backward, forward, ordering)
+
+    def test_unsupported_ordering_is_rejected(self):
+        from .pagination import CursorPaginator, cursor_ordering
+
+        self.assertIsNone(cursor_ordering(Product.objects.order_by('category')))
+        with self.assertRaises(ValueError):
+            CursorPaginator(Product.objects.order_by('category'), 3)
+
+    def test_tampered_or_foreign_cursor_restarts(self):
+        from django.core import signing
+
+        from .pagination import CURSOR_SALT, CursorPaginator
+
+        paginator = CursorPaginator(Product.objects.order_by('price'), 3)
+        first = paginator.get_page()
+        cursor = first.next_cursor
+        forged = [
+            cursor[:-2] + ('AA' if not cursor.endswith('AA') else 'BB'),
+            'not-a-cursor',
+            signing.dumps({'k': ['10.00'], 'r': 0}, salt=CURSOR_SALT),
+            signing.dumps({'k': ['cheap', 1], 'r': 0}, salt=CURSOR_SALT),
+            signing.dumps({'k': ['10.00', 1]}, salt=CURSOR_SALT),
+        ]
+        for value in forged:
+            page = paginator.get_page(value)
+            self.assertEqual(list(page), list(first), value)
+            self.assertFalse(page.has_previous())
+
+    def test_listing_links_use_cursors(self):
+        for i in range(7, 14):
+            Product.objects.create(name=f'Item {i}', price='20.00', sku=f'ITEM-{i}', stock_quantity=1)
+        response = self.client.get(reverse('products'), {'sort': 'price_low'}, secure=True)
+        page = response.context['page_obj']
+        self.assertTrue(page.is_cursor)
+        self.assertContains(response, urlencode({'cursor': page.next_cursor}))
+
+
+class VersionTokenTest(TestCase):
+
+    def test_evicted_version_never_returns_to_an_old_token(self):
+        from .cache import CATALOGUE_VERSION_KEY, bump_catalogue_version, get_catalogue_version
+
+        cache.clear()
+        seen = {get_catalogue_version()}
+        for _ in range(5):
+            cache.delete(CATALOGUE_VERSION_KEY)
+            seen.add(get_catalogue_version())
+            seen.add(bump_catalogue_version())
+        self.assertEqual(len(seen), 11)
+        self.assertEqual(get_catalogue_version(), get_catalogue_version())
+
+    def test_catalogue_version_is_bumped_on_commit(self):
+        from .cache import get_catalogue_version
+
+        version = get_catalogue_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name='Cap', price='5.00', sku='CAP-1')
+            self.assertEqual(get_catalogue_version(), version)
+        self.assertNotEqual(get_catalogue_version(), version)
+
+
+class FacetTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tops = Category.objects.create(name='Tops')
+        cls.shoes = Category.objects.create(name='Shoes')
+        for sku, category, price, stock in (
+            ('TOP-1', cls.tops, '10.00', 3),
+            ('TOP-2', cls.tops, '30.00', 0),
+            ('TOP-3', cls.tops, '120.00', 1),
+            ('SHOE-1', cls.shoes, '45.00', 2),
+            ('SHOE-2', cls.shoes, '250.00', 0),
+        ):
+            Product.objects.create(name=sku, category=category, price=price, sku=sku, stock_quantity=stock)
+        Product.objects.create(name='Hidden', category=cls.tops, price='10.00', sku='OFF-1', is_active=False)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_counts_in_one_query(self):
+        from .facets import compute_facets, get_categories
+
+        get_categories()
+        with self.assertNumQueries(1):
+            facets = compute_facets({'category': self.tops.slug, 'min_price': '20'})
+
+        counts = {category.name: category.product_count for category in facets['categories']}
+        # Category counts respect the price filter, price buckets ignore it
+        self.assertEqual(counts, {'Shoes': 2, 'Tops': 2})
+        self.assertEqual([count for *_, count in facets['price_ranges']], [1, 1, 0, 1, 0])
+        self.assertEqual((facets['total'], facets['in_stock']), (2, 1))
+
+    def test_cached_per_filter_set(self):
+        from .facets import get_facets
+
+        get_facets({'category': self.shoes.slug})
+        with self.assertNumQueries(0):
+            self.assertEqual(get_facets({'category': self.shoes.slug})['total'], 2)
+        self.assertEqual(get_facets({})['total'], 5)
+
+
+class RelatedProductsBuildTest(TestCase):
+
+    def setUp(self):
+        self.hat, self.scarf, self.gloves = [
+            Product.objects.create(name=name, price='10.00', sku=name.upper(), stock_quantity=50)
+            for name in ('Hat', 'Scarf', 'Gloves')
+        ]
+
+    def order(self, *products, age=timedelta(hours=1)):
+        from apps.order.models import Order, OrderItem
+
+        order = Order.objects.create(subtotal=0, total_amount=0)
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, quantity=1)
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - age)
+        return order
+
+    def scores(self):
+        return {
+            (relation.product.name, relation.related.name): relation.score
+            for relation in ProductRelation.objects.filter(source='orders').select_related('product', 'related')
+        }
+
+    def build(self, at=None):
+        from .related import build_related_products
+
+        with mock.patch('apps.product.related.timezone.now', return_value=at or timezone.now()):
+            return build_related_products()
+
+    def test_counts_settled_orders_only_once(self):
+        self.order(self.hat, self.scarf)
+        fresh = self.order(self.hat, self.scarf, age=timedelta(0))
+        self.build()
+        self.assertEqual(self.scores(), {('Hat', 'Scarf'): 1, ('Scarf', 'Hat'): 1})
+
+        # The fresh order is picked up once it has settled, even though a
+        # later order was counted first, and reruns add nothing
+        self.build(at=fresh.created_at + timedelta(minutes=15))
+        self.build(at=fresh.created_at + timedelta(minutes=20))
+        self.assertEqual(self.scores()[('Hat', 'Scarf')], 2)
+
+    def test_cancellations_are_subtracted(self):
+        from apps.order.cancellation import cancel_orders
+        from apps.order.models import Order
+
+        self.order(self.hat, self.gloves)
+        counted = self.order(self.hat, self.scarf)
+        skipped = self.order(self.scarf, self.gloves)
+        cancel_orders(Order.objects.filter(pk=skipped.pk))
+        self.build(at=timezone.now() + timedelta(minutes=15))
+        self.assertNotIn(('Scarf', 'Gloves'), self.scores())
+
+        # Cancelled after the run that counted it
+        cancel_orders(Order.objects.filter(pk=counted.pk))
+        counted.status_events.update(created_at=timezone.now() + timedelta(minutes=20))
+        self.build(at=timezone.now() + timedelta(minutes=40))
+        self.assertEqual(self.scores(), {('Hat', 'Gloves'): 1, ('Gloves', 'Hat'): 1})
+
+
+class ProductStatsTest(TestCase):
+
+    def setUp(self):
+        self.old, self.new, self.unsold = [
+            Product.objects.create(name=name, price='5.00', sku=name.upper(), stock_quantity=100)
+            for name in ('Old', 'New', 'Unsold')
+        ]
+
+    def test_record_and_reverse_sales(self):
+        from .models import ProductStats
+        from .stats import record_sales, reverse_sales
+
+        sold_at = timezone.now()
+        with self.assertNumQueries(4):  # savepoint, insert, update, release
+            record_sales([(self.old.pk, 2), (self.new.pk, 1), (self.old.pk, 1)], sold_at)
+        stats = ProductStats.objects.get(product=self.old)
+        self.assertEqual((stats.units_sold, stats.order_count, stats.last_sold_at), (3, 1, sold_at))
+
+        record_sales([(self.old.pk, 1)], sold_at)
+        reverse_sales([(self.old.pk, 1)], sold_at)
+        reverse_sales([(self.new.pk, 5)], sold_at)
+        self.assertEqual(ProductStats.objects.get(product=self.old).units_sold, 3)
+        new = ProductStats.objects.get(product=self.new)
+        self.assertEqual((new.units_sold, new.order_count, new.score), (0, 0, 0))
+
+    def test_recent_sales_outrank_older_ones(self):
+        from main.templatetags.nix import get_popular_products
+
+        from .stats import DECAY_HALF_LIFE_DAYS, decay_weight, record_sales
+
+        now = timezone.now()
+        self.assertAlmostEqual(decay_weight(now) / decay_weight(now - timedelta(days=DECAY_HALF_LIFE_DAYS)), 2)
+        # Three units two half-lives ago weigh less than one unit today
+        record_sales([(self.old.pk, 3)], now - timedelta(days=2 * DECAY_HALF_LIFE_DAYS))
+        record_sales([(self.new.pk, 1)], now)
+        self.assertEqual(list(get_popular_products()), [self.new, self.old])
+
+    def test_popular_falls_back_without_sales(self):
+        from main.templatetags.nix import get_popular_products
+
+        self.assertEqual(len(get_popular_products()), 3)
+
+
+class SlugAllocationTest(TestCase):
+
+    def make(self, name):
+        self.made = getattr(self, 'made', 0) + 1
+        return Product.objects.create(name=name, price='1.00', sku=f'SKU-{self.made}')
+
+    def test_collisions_get_the_next_free_suffix(self):
+        slugs = [self.make(name).slug for name in ('Shirt', 'Shirt', 'Shirt 1', 'Shirt', 'shirt!')]
+        self.assertEqual(slugs, ['shirt', 'shirt-1', 'shirt-1-1', 'shirt-2', 'shirt-3'])
+
+    def test_freed_gaps_are_reused_and_own_slug_is_kept(self):
+        from .slugs import allocate_slug
+
+        first, second = self.make('Cap'), self.make('Cap')
+        self.assertEqual(allocate_slug(Product, 'Cap', first), 'cap')
+        first.delete()
+        self.assertEqual(self.make('Cap').slug, 'cap')
+        self.assertEqual(second.slug, 'cap-1')
+        self.assertEqual(self.make('').slug, 'product')
+
+    def test_batch_allocation_uses_one_query(self):
+        from .slugs import assign_slugs
+
+        self.make('Sock')
+        batch = [Product(name=name) for name in ('Sock', 'Sock', 'Boot', 'Sock 2')]
+        batch.append(Product(name='Boot', slug='boot'))
+        with self.assertNumQueries(1):
+            assign_slugs(batch)
+        self.assertEqual([product.slug for product in batch], ['sock-1', 'sock-2', 'boot-1', 'sock-2-1', 'boot'])
+
+    def test_long_names_are_truncated_below_max_length(self):
+        from .slugs import assign_slugs
+
+        max_length = Product._meta.get_field('slug').max_length
+        name = 'word ' * 40
+        products = [self.make(name) for _ in range(3)]
+        products += assign_slugs([Product(name=name) for _ in range(11)])
+        slugs = [product.slug for product in products]
+        self.assertEqual(len(set(slugs)), len(slugs))
+        self.assertTrue(all(len(slug) <= max_length and not slug.startswith('-') for slug in slugs))
+        self.assertTrue(slugs[0].startswith('word-word'))
+        self.assertEqual(slugs[-1], f'{slugs[0]}-13')
+
+
+class ImporterTest(TestCase):
+
+    def run_import(self, text, file_format='csv', batch_size=500):
+        from io import StringIO
+        from .importer import import_products
+
+        return import_products(StringIO(text), file_format, batch_size)
+
+    def test_creates_then_updates_by_sku(self):
+        result = self.run_import(
+            'sku,name,price,stock_quantity,category,sizes,colors\n'
+            'TEE-1,Tee,10,5,Tops,S|M,Red:#ff0000\n'
+        )
+        self.assertEqual((result.created, result.updated, result.errors), (1, 0, []))
+        product = Product.objects.get(sku='TEE-1')
+        self.assertEqual((product.name, str(product.price), product.stock_quantity), ('Tee', '10.00', 5))
+        self.assertEqual(product.category.name, 'Tops')
+
+        result = self.run_import('sku,price,sizes,colors\nTEE-1,12.5,M|L,Red:#cc0000\n')
+        self.assertEqual((result.created, result.updated, result.errors), (0, 1, []))
+        product.refresh_from_db()
+        self.assertEqual((product.name, str(product.price), product.stock_quantity), ('Tee', '12.50', 5))
+        self.assertEqual(sorted(product.sizes.values_list('name', flat=True)), ['L', 'M', 'S'])
+        self.assertEqual(list(product.colors.values_list('name', 'hex_code')), [('Red', '#cc0000')])
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        result = self.run_import(
+            'sku,name,price,stock_quantity,is_active\n'
+            ',Nameless,1,1,yes\n'
+            'BAD-1,Bad,abc,1,yes\n'
+            'BAD-2,Bad,1,-3,yes\n'
+            'BAD-3,Bad,1,1,maybe\n'
+            'NEW-1,,1,1,yes\n'
+            'OK-1,Fine,1,1,no\n'
+        )
+        self.assertEqual((result.rows, result.created), (6, 1))
+        self.assertEqual([error['line'] for error in result.errors], [2, 3, 4, 5, 6])
+        self.assertEqual(result.errors[1]['message'], 'price: "abc" is not a number')
+        self.assertEqual(result.errors[4]['message'], 'name and price are required for new products')
+        self.assertFalse(Product.objects.get(sku='OK-1').is_active)
+
+    def test_values_out_of_field_range_fail_their_row_only(self):
+        result = self.run_import(
+            'sku,name,price,stock_quantity\n'
+            'BIG-1,Big,123456789012,1\n'
+            'BIG-2,Big,1e30,1\n'
+            f'BIG-3,Big,1,{10 ** 20}\n'
+            'OK-1,Fine,99999999.99,1\n'
+        )
+        self.assertEqual(result.created, 1)
+        self.assertEqual([error['line'] for error in result.errors], [2, 3, 4])
+        self.assertTrue(result.errors[0]['message'].startswith('price: Ensure that there are no more than 10 digits'))
+        self.assertTrue(result.errors[2]['message'].startswith('stock_quantity: Ensure this value is less than'))
+
+    def test_duplicate_skus_keep_the_first_row(self):
+        result = self.run_import(
+            '{"sku": "DUP-1", "name": "First", "price": 1}\n'
+            '{"sku": "DUP-1", "name": "Second", "price": 2}\n'
+            '[1, 2]\n',
+            file_format='jsonl',
+        )
+        self.assertEqual(result.created, 1)
+        self.assertEqual(Product.objects.get(sku='DUP-1').name, 'First')
+        self.assertEqual(
+            [(error['line'], error['message']) for error in result.errors],
+            [(3, 'Row is not a JSON object'), (2, 'duplicate sku in the same batch, later row ignored')],
+        )
+
+    def test_new_products_get_unique_slugs(self):
+        Product.objects.create(name='Hat', price='1.00', sku='HAT-0')
+        result = self.run_import('sku,name,price\nHAT-1,Hat,1\nHAT-2,Hat,1\nHAT-3,Hat,1\n', batch_size=2)
+        self.assertEqual(result.created, 3)
+        self.assertEqual(
+            list(Product.objects.filter(sku__startswith='HAT').order_by('sku').values_list('slug', flat=True)),
+            ['hat', 'hat-1', 'hat-2', 'hat-3'],
+        )
+
+    def test_first_new_image_becomes_primary(self):
+        self.run_import('sku,name,price,images\nIMG-1,Bag,5,products/bag-front|products/bag-back\n')
+        product = Product.objects.get(sku='IMG-1')
+        front = product.images.get(is_primary=True)
+        self.assertEqual(str(front.image), 'products/bag-front')
+        self.assertEqual((product.primary_image_id, product.primary_image_url), (front.pk, front.get_image_url()))
+
+        self.run_import('sku,images\nIMG-1,products/bag-front|products/bag-side\n')
+        product.refresh_from_db()
+        self.assertEqual(product.images.count(), 3)
+        self.assertEqual(product.primary_image_id, front.pk)
+        self.assertEqual(product.images.filter(is_primary=True).count(), 1)
+
+    def test_unreadable_file_keeps_earlier_batches(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from .importer import import_products, open_upload
+
+        good = ''.join(f'LATIN-{n},Item {n},1\n' for n in range(1000))
+        content = f'sku,name,price\n{good}LATIN-X,Caf\xe9,1\n'.encode('utf-8') + 'Caf\xe9'.encode('cp1252')
+        result = import_products(open_upload(SimpleUploadedFile('export.csv', content)), batch_size=100)
+        self.assertTrue(result.created)
+        self.assertEqual(Product.objects.filter(sku__startswith='LATIN-').count(), result.created)
+        self.assertIn('file is not UTF-8', result.stopped['message'])
+        self.assertIn('stopped at line', result.summary())
+
+        result = self.run_import('sku,name,price\nOK-1,Fine,1\nBAD-1,"' + 'x' * 200000 + '",1\n', batch_size=1)
+        self.assertEqual((result.created, result.rows), (1, 1))
+        self.assertIn('unreadable CSV', result.errors[-1]['message'])
+
+    def test_kept_errors_are_capped(self):
+        with mock.patch('apps.product.importer.MAX_ERRORS', 2):
+            result = self.run_import('sku,name,price\n' + 'BAD,Bad,abc\n' * 5)
+        self.assertEqual((len(result.errors), result.error_count), (2, 5))
+        self.assertIn('5 errors', result.summary())
+
+    def test_json_arrays_are_not_accepted_as_jsonl(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from main.forms import ProductImportForm
+        from .importer import detect_format
 
-# Create your tests here.
+        self.assertEqual(detect_format('products.jsonl'), 'jsonl')
+        self.assertEqual(detect_format('products.CSV'), 'csv')
+        form = ProductImportForm(files={'file': SimpleUploadedFile('products.json', b'[]')})
+        self.assertFalse(form.is_valid())
+        form = ProductImportForm(files={'file': SimpleUploadedFile('products.jsonl', b'{}')})
+        self.assertTrue(form.is_valid())
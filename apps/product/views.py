@@ -1,44 +1,71 @@
 from django.views.generic import ListView, DetailView
-from django.db.models import Q
-from django.core.paginator import Paginator
+from main.pagecache import get_page_cache_version, get_site_version, normalize_query_string
 from .models import Product, Category
+from .cache import get_product_version
+from .conditional import ConditionalGetMixin
+from .facets import get_facets
+from .counting import CachedCountPaginator, get_cached_count
+from .filters import filter_signature, get_listing_filters
+from .loaders import product_detail_context, product_detail_queryset
+from .pagination import CursorPaginator, cursor_ordering
+from .search import search_products
 
-class ProductListView(ListView):
+
+class CursorPaginationMixin:
+    """Opt-in keyset pagination (set pagination_mode = 'cursor')"""
+    pagination_mode = 'offset'
+
+    def use_cursor_pagination(self, queryset):
+        # Requests carrying a cursor keep paging by cursor so issued links stay valid
+        wants_cursor = self.pagination_mode == 'cursor' or 'cursor' in self.request.GET
+        return wants_cursor and cursor_ordering(queryset) is not None
+
+    def get_cursor_page(self, queryset, page_size):
+        paginator = CursorPaginator(queryset, page_size)
+        return paginator, paginator.get_page(self.request.GET.get('cursor'))
+
+
+class ProductListView(ConditionalGetMixin, CursorPaginationMixin, ListView):
     """List all products with filtering and pagination"""
     model = Product
     template_name = 'product/products.html'
     context_object_name = 'products'
     paginate_by = 12
+    pagination_mode = 'cursor'
+    cache_max_age = 60
+    paginator_class = CachedCountPaginator
+    # Above this many planner-estimated rows the paginator shows an approximate count
+    count_estimate_threshold = 10000
+
+    def get_filters(self):
+        if not hasattr(self, '_filters'):
+            self._filters = get_listing_filters(self.request.GET)
+        return self._filters
 
     def get_queryset(self):
         queryset = Product.objects.filter(is_active=True).select_related('category')
+        filters = self.get_filters()
         
         # Search functionality
-        search_query = self.request.GET.get('q')
+        search_query = filters['q']
         if search_query:
-            queryset = queryset.filter(
-                Q(name__icontains=search_query) |
-                Q(category__name__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(short_description__icontains=search_query)
-            )
+            queryset = search_products(queryset, search_query)
         
         # Category filtering
-        category_slug = self.request.GET.get('category')
-        if category_slug:
-            queryset = queryset.filter(category__slug=category_slug)
+        if filters['category']:
+            queryset = queryset.filter(category__slug=filters['category'])
         
         # Price filtering
-        min_price = self.request.GET.get('min_price')
-        max_price = self.request.GET.get('max_price')
-        if min_price:
-            queryset = queryset.filter(price__gte=min_price)
-        if max_price:
-            queryset = queryset.filter(price__lte=max_price)
+        if filters['min_price']:
+            queryset = queryset.filter(price__gte=filters['min_price'])
+        if filters['max_price']:
+            queryset = queryset.filter(price__lte=filters['max_price'])
         
-        # Sorting
-        sort_by = self.request.GET.get('sort', 'name')
-        if sort_by == 'price_low':
+        # Sorting (search results default to relevance)
+        sort_by = self.request.GET.get('sort', 'relevance' if search_query else 'name')
+        if sort_by == 'relevance' and search_query:
+            queryset = queryset.order_by('-search_rank', 'name')
+        elif sort_by == 'price_low':
             queryset = queryset.order_by('price')
         elif sort_by == 'price_high':
             queryset = queryset.order_by('-price')
@@ -49,50 +76,81 @@ class ProductListView(ListView):
         
         return queryset
 
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_cursor_pagination(queryset):
+            return super().paginate_queryset(queryset, page_size)
+        paginator, page = self.get_cursor_page(queryset, page_size)
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        return super().get_paginator(
+            queryset, per_page, orphans, allow_empty_first_page,
+            count_key=f'listing:{filter_signature(self.get_filters())}',
+            estimate_above=self.count_estimate_threshold,
+            **kwargs
+        )
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.all()
+        context['facets'] = get_facets(self.get_filters())
+        context['categories'] = context['facets']['categories']
         context['current_category'] = self.request.GET.get('category', '')
         context['search_query'] = self.request.GET.get('q', '')
         context['current_sort'] = self.request.GET.get('sort', 'name')
         return context
 
 
-class ProductDetailView(DetailView):
+class ProductDetailView(ConditionalGetMixin, DetailView):
     """Detailed product view"""
     model = Product
     template_name = 'product/product_detail.html'
     context_object_name = 'product'
     slug_field = 'slug'
     slug_url_kwarg = 'slug'
+    cache_max_age = 300
 
     def get_queryset(self):
-        return Product.objects.filter(is_active=True).select_related('category')
+        return product_detail_queryset()
+
+    def get_object(self, queryset=None):
+        # Shared by the validators and DetailView.get
+        if not hasattr(self, '_product'):
+            self._product = super().get_object(queryset)
+        return self._product
+
+    def get_etag_parts(self):
+        product = self.get_object()
+        return [get_site_version(), product.pk, product.updated_at.timestamp(), get_product_version(product.pk)]
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        product = self.get_object()
-        context['sizes'] = product.sizes.all()
-        context['colors'] = product.colors.all()
-        context['images'] = product.images.all()
-        context['related_products'] = Product.objects.filter(
-            category=product.category,
-            is_active=True
-        ).exclude(id=product.id)[:4]
+        context.update(product_detail_context(self.object))
         return context
 
 
-class CategoryDetailView(DetailView):
+class CategoryDetailView(ConditionalGetMixin, CursorPaginationMixin, DetailView):
     """Category detail view with products"""
     model = Category
     template_name = 'store/category_detail.html'
     context_object_name = 'category'
     slug_field = 'slug'
     slug_url_kwarg = 'slug'
+    pagination_mode = 'cursor'
+    cache_max_age = 120
+
+    def get_object(self, queryset=None):
+        # Shared by the validators and DetailView.get
+        if not hasattr(self, '_category'):
+            self._category = super().get_object(queryset)
+        return self._category
+
+    def get_etag_parts(self):
+        query_string = normalize_query_string(self.request.META.get('QUERY_STRING', ''))
+        return [get_page_cache_version(), self.get_object().pk, query_string]
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        category = self.get_object()
+        category = self.object
         
         # Get products in this category with pagination
         products = Product.objects.filter(
@@ -100,10 +158,17 @@ class CategoryDetailView(DetailView):
             is_active=True
         ).order_by('name')
         
-        paginator = Paginator(products, 12)
-        page_number = self.request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
+        count_key = f'category:{category.pk}'
+        if self.use_cursor_pagination(products):
+            paginator, page_obj = self.get_cursor_page(products, 12)
+            product_count = get_cached_count(products, count_key)
+        else:
+            paginator = CachedCountPaginator(products, 12, count_key=count_key)
+            page_number = self.request.GET.get('page')
+            page_obj = paginator.get_page(page_number)
+            product_count = paginator.count
         
         context['products'] = page_obj
-        context['product_count'] = products.count()
+        context['page_obj'] = page_obj
+        context['product_count'] = product_count
         return context
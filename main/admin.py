@@ -1,12 +1,21 @@
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.template.response import TemplateResponse
+from django.urls import path
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import Group
 from django.contrib.sites.models import Site
 from django.utils.html import format_html
-from django.db.models import Count
+from django.db.models import Count, Sum
 from django.contrib.admin import SimpleListFilter
+from django.contrib import messages
+from apps.product.cache import bump_catalogue_version
+from apps.product.importer import detect_format, import_products, open_upload
 from apps.product.models import Product, Category, Size, Color, Image
-from apps.order.models import Order, OrderItem  # Keeping only Order and OrderItem
+from apps.order.cancellation import cancel_orders
+from apps.order.models import Order, OrderItem, OrderStatusEvent
+from apps.order.status import transition_orders
+from .forms import ProductImportForm
 from .models import User, Config
 
 # Hide default admin sections
@@ -98,13 +107,25 @@ class ImageInline(admin.TabularInline):
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
-    fields = ('product', 'quantity', 'size', 'color', 'item_total')
+    fields = ('product', 'quantity', 'size', 'color', 'unit_price', 'item_total')
     readonly_fields = fields
 
     def item_total(self, obj):
-        return f"${obj.get_total_price():.2f}"
+        if obj.line_total is None:
+            return "-"
+        return f"${obj.line_total:.2f}"
     item_total.short_description = "Total"
 
+class OrderStatusEventInline(admin.TabularInline):
+    model = OrderStatusEvent
+    extra = 0
+    fields = ('created_at', 'from_status', 'to_status', 'changed_by')
+    readonly_fields = fields
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
 # ---------------- Admin Classes ----------------
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
@@ -150,6 +171,7 @@ class ProductAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at', 'updated_at', 'primary_image_preview')
     list_editable = ('price', 'stock_quantity', 'is_active', 'is_featured')
     list_per_page = 10
+    change_list_template = 'admin/product/product/change_list.html'
     
     fieldsets = (
         ('Basic Information', {
@@ -172,6 +194,33 @@ class ProductAdmin(admin.ModelAdmin):
     
     inlines = [ImageInline, SizeInline, ColorInline]
 
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view), name='product_product_import'),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        if not (self.has_add_permission(request) and self.has_change_permission(request)):
+            raise PermissionDenied
+
+        form = ProductImportForm(request.POST or None, request.FILES or None)
+        result = None
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            result = import_products(open_upload(upload), detect_format(upload.name))
+            level = messages.WARNING if result.errors else messages.SUCCESS
+            self.message_user(request, result.summary(), level)
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Import products',
+            'opts': self.model._meta,
+            'form': form,
+            'result': result,
+            'errors': result.errors[:100] if result else [],
+        }
+        return TemplateResponse(request, 'admin/product/product/import.html', context)
+
     def stock_status(self, obj):
         if obj.stock_quantity == 0:
             return format_html('<span style="color: red; font-weight: bold;">Out of Stock</span>')
@@ -182,11 +231,10 @@ class ProductAdmin(admin.ModelAdmin):
     stock_status.short_description = "Stock Status"
 
     def primary_image_preview(self, obj):
-        primary_image = obj.get_primary_image()
-        if primary_image:
+        if obj.primary_image_url:
             return format_html(
                 '<img src="{}" style="width: 64px; height: 64px; object-fit: cover;" />',
-                primary_image.image.url
+                obj.primary_image_url
             )
         return "No Primary Image"
     primary_image_preview.short_description = "Primary Image"
@@ -195,11 +243,13 @@ class ProductAdmin(admin.ModelAdmin):
 
     def mark_as_active(self, request, queryset):
         updated = queryset.update(is_active=True)
+        bump_catalogue_version()
         self.message_user(request, f'{updated} products marked as active.')
     mark_as_active.short_description = "Mark selected products as active"
 
     def mark_as_inactive(self, request, queryset):
         updated = queryset.update(is_active=False)
+        bump_catalogue_version()
         self.message_user(request, f'{updated} products marked as inactive.')
     mark_as_inactive.short_description = "Mark selected products as inactive"
 
@@ -209,10 +259,10 @@ class OrderAdmin(admin.ModelAdmin):
     list_display = ('order_number', 'created_at', 'user_info', 'status', 'total_amount', 'total_items')
     list_filter = ('status', OrderStatusFilter, 'created_at')
     search_fields = ('order_number', 'user__username', 'address__email')
-    readonly_fields = ('user', 'order_number', 'user_info', 'total_amount', 'subtotal', 'total_items', 'created_at', 'shipping_cost', 'address')
-    list_editable = ('status',)
+    # Status only changes through the actions below, which follow the transition rules
+    readonly_fields = ('user', 'order_number', 'user_info', 'status', 'total_amount', 'subtotal', 'total_items', 'created_at', 'shipping_cost', 'address')
     date_hierarchy = 'created_at'
-    inlines = [OrderItemInline]
+    inlines = [OrderItemInline, OrderStatusEventInline]
 
     def user_info(self, obj):
         if obj.address:
@@ -222,36 +272,41 @@ class OrderAdmin(admin.ModelAdmin):
         return "Guest Order"
     user_info.short_description = "Customer"
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(item_count=Sum('items__quantity'))
+
     def total_items(self, obj):
-        return obj.get_total_items()
+        return obj.item_count or 0
     total_items.short_description = "Items"
 
-    actions = ['mark_as_confirmed', 'mark_as_shipped', 'mark_as_delivered']
+    actions = ['mark_as_confirmed', 'mark_as_shipped', 'mark_as_delivered', 'cancel_orders']
 
     def mark_as_confirmed(self, request, queryset):
-        updated = queryset.filter(status='pending').update(status='confirmed')
+        updated = transition_orders(queryset, 'confirmed', user=request.user)
         self.message_user(request, f'{updated} orders marked as confirmed.')
     mark_as_confirmed.short_description = "Mark selected orders as confirmed"
 
     def mark_as_shipped(self, request, queryset):
-        orders = queryset.filter(status__in=['confirmed', 'processing'])
-        updated = 0
-        for order in orders:
-            order.mark_as_shipped()
-            updated += 1
+        updated = transition_orders(queryset, 'shipped', user=request.user)
         self.message_user(request, f'{updated} orders marked as shipped.')
     mark_as_shipped.short_description = "Mark selected orders as shipped"
 
     def mark_as_delivered(self, request, queryset):
-        updated = queryset.filter(status='shipped').update(status='delivered')
+        updated = transition_orders(queryset, 'delivered', user=request.user)
         self.message_user(request, f'{updated} orders marked as delivered.')
     mark_as_delivered.short_description = "Mark selected orders as delivered"
 
+    def cancel_orders(self, request, queryset):
+        cancelled = cancel_orders(queryset, user=request.user)
+        self.message_user(request, f'{cancelled} orders cancelled and restocked.')
+    cancel_orders.short_description = "Cancel selected orders and restock"
+
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
     list_per_page = 10
-    list_display = ('order_number', 'product', 'quantity', 'size', 'color', 'item_total')
+    list_display = ('order_number', 'product', 'quantity', 'size', 'color', 'unit_price', 'item_total')
     list_filter = ('order__status', 'order__created_at', 'product__category')
+    list_select_related = ('order', 'product', 'size', 'color')
     search_fields = ('order__order_number', 'product__name')
 
     def order_number(self, obj):
@@ -259,7 +314,7 @@ class OrderItemAdmin(admin.ModelAdmin):
     order_number.short_description = "Order"
 
     def item_total(self, obj):
-        return f"${obj.get_total_price():.2f}"
+        return f"${obj.line_total:.2f}"
     item_total.short_description = "Total"
 
 # ---------------- Config model ----------------
@@ -0,0 +1,35 @@
+import time
+
+from django.core.cache import cache
+
+CONFIG_CACHE_KEY = 'main:config'
+# How long a process trusts its own copy before re-reading the shared cache.
+# A save clears the shared entry, so other processes pick it up within this
+# window as long as CACHES is shared between them (see main.checks).
+LOCAL_TIMEOUT = 10
+# Upper bound on a stale shared entry, for writes that skip the save signals
+# such as queryset.update() or edits made directly in the database.
+SHARED_TIMEOUT = 300
+
+_MISSING = object()
+_local = {'config': None, 'expires': 0}
+
+
+def get_config():
+    """The site Config row, or None, read from the process and shared caches"""
+    now = time.monotonic()
+    if _local['expires'] > now:
+        return _local['config']
+
+    config = cache.get(CONFIG_CACHE_KEY, _MISSING)
+    if config is _MISSING:
+        from .models import Config
+        config = Config.objects.first()
+        cache.set(CONFIG_CACHE_KEY, config, SHARED_TIMEOUT)
+    _local.update(config=config, expires=now + LOCAL_TIMEOUT)
+    return config
+
+
+def clear_config_cache():
+    cache.delete(CONFIG_CACHE_KEY)
+    _local.update(config=None, expires=0)
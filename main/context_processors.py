@@ -0,0 +1,112 @@
+from decimal import Decimal
+
+from django.contrib import messages
+from django.urls import Resolver404, resolve
+from django.utils.functional import cached_property
+
+from apps.cart.identity import cart_lookup
+from apps.cart.models import Cart, CartItem
+from apps.cart.pricing import CartSnapshot
+from apps.cart.summary import read_cart_summary
+
+from .config import get_config
+
+
+class SiteContext:
+    """Per-request values shared by the layout and template tags.
+
+    Every attribute is computed on first use and at most once per request.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.cart_summary_changed = False
+
+    @cached_property
+    def config(self):
+        return get_config()
+
+    def _cart_lookup(self):
+        return cart_lookup(self.request)
+
+    @cached_property
+    def cart(self):
+        lookup = self._cart_lookup()
+        if lookup is None:
+            return None
+        return Cart.objects.filter(**lookup).first()
+
+    @cached_property
+    def cart_snapshot(self):
+        """Priced cart items in one joined query, reusing a cart the view already loaded"""
+        cart = self.__dict__.get('cart')
+        if cart is not None:
+            return cart.get_snapshot()
+        lookup = self._cart_lookup()
+        if lookup is None:
+            return CartSnapshot(CartItem.objects.none())
+        return CartSnapshot(CartItem.objects.filter(**{f'cart__{key}': value for key, value in lookup.items()}))
+
+    @cached_property
+    def cart_summary(self):
+        """Item count and subtotal, from the signed cookie when it is still valid"""
+        summary = None if self.cart_summary_changed else read_cart_summary(self.request)
+        if summary is None:
+            if self._cart_lookup() is None:
+                return {'total_items': 0, 'total_price': Decimal('0.00')}
+            summary = {
+                'total_items': self.cart_snapshot.total_items,
+                'total_price': self.cart_snapshot.subtotal,
+                'product_ids': sorted({item.product_id for item in self.cart_snapshot.items}),
+            }
+            self.cart_summary_changed = True
+        return summary
+
+    def refresh_cart_summary(self):
+        """Forget cached totals after the cart changed; the cookie is rewritten on the way out"""
+        cart = self.__dict__.get('cart')
+        if cart is not None:
+            cart._snapshot = None
+        self.__dict__.pop('cart_snapshot', None)
+        self.__dict__.pop('cart_summary', None)
+        self.cart_summary_changed = True
+
+    @property
+    def cart_count(self):
+        return self.cart_summary['total_items']
+
+    @cached_property
+    def has_messages(self):
+        # len() does not mark the messages as read
+        return bool(len(messages.get_messages(self.request)))
+
+    @cached_property
+    def is_shared(self):
+        """True when the page shows nothing specific to this visitor"""
+        return (
+            not self.request.user.is_authenticated
+            and not self.has_messages
+            and self.cart_count == 0
+        )
+
+    @cached_property
+    def url_name(self):
+        """Name of the current URL, reusing the handler's resolution when available"""
+        match = getattr(self.request, 'resolver_match', None)
+        if match is None:
+            try:
+                match = resolve(self.request.path_info)
+            except Resolver404:
+                return None
+        return match.url_name
+
+
+def get_site_context(request):
+    site = getattr(request, '_site_context', None)
+    if site is None:
+        site = request._site_context = SiteContext(request)
+    return site
+
+
+def site(request):
+    return {'site': get_site_context(request)}
@@ -390,4 +390,20 @@ class UserProfileUpdateForm(forms.ModelForm):
         email = self.cleaned_data.get('email')
         if User.objects.filter(email=email).exclude(pk=self.instance.pk).exists():
             raise forms.ValidationError("A user with this email already exists.")
-        return email
\ No newline at end of file
+        return email
+
+
+class ProductImportForm(forms.Form):
+    """Admin upload form for bulk product imports"""
+
+    file = forms.FileField(
+        help_text="CSV or JSONL file with one product per row, matched by SKU."
+    )
+
+    def clean_file(self):
+        """Validate file extension"""
+        upload = self.cleaned_data.get('file')
+        # JSONL is read line by line; a plain .json array would fail on every row
+        if not upload.name.lower().endswith(('.csv', '.jsonl', '.ndjson')):
+            raise forms.ValidationError("Upload a .csv or .jsonl file, one JSON object per line.")
+        return upload
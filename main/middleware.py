@@ -0,0 +1,99 @@
+import re
+
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from .context_processors import get_site_context
+from .pagecache import (
+    CACHED_URL_NAMES, CachedPage, acquire_refresh, get_page, get_page_cache_version,
+    page_cache_key, release_refresh, set_page,
+)
+
+CSRF_INPUT_RE = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+# Validators and caching policy set by the views, replayed on cache hits
+CACHED_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control')
+
+
+class AnonymousPageCacheMiddleware:
+    """Full-page cache for anonymous catalogue pages.
+
+    Only GET/HEAD requests to CACHED_URL_NAMES from visitors that are not
+    logged in, have no pending messages and an empty cart are cached. Stale
+    pages keep being served while one request re-renders them. CSRF tokens
+    in cached forms are replaced with the visitor's own on every hit.
+    Conditional requests against a cached page are answered with 304.
+    Must come after the session, auth, messages and CSRF middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.process_response(request, self.get_response(request))
+
+    def is_cacheable(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        match = request.resolver_match
+        if match is None or match.url_name not in CACHED_URL_NAMES:
+            return False
+        return get_site_context(request).is_shared
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not self.is_cacheable(request):
+            return None
+        key = page_cache_key(request)
+        request._page_cache_key = key
+        version = request._page_cache_version = get_page_cache_version()
+
+        page = get_page(key)
+        if page is None:
+            return None
+        if page.is_fresh(version):
+            return self.build_response(request, page, 'hit')
+        if acquire_refresh(key):
+            request._page_cache_refreshing = True
+            return None
+        return self.build_response(request, page, 'stale')
+
+    def build_response(self, request, page, status):
+        response = get_conditional_response(
+            request,
+            etag=page.headers.get('ETag'),
+            last_modified=parse_http_date_safe(page.headers.get('Last-Modified', '')),
+        )
+        if response is None:
+            content = CSRF_INPUT_RE.sub(
+                lambda match: f'{match.group(1)}{get_token(request)}{match.group(2)}', page.content
+            )
+            response = HttpResponse(content, content_type=page.content_type)
+        for header, value in page.headers.items():
+            response[header] = value
+        response['X-Page-Cache'] = status
+        response._from_page_cache = True
+        return response
+
+    def process_response(self, request, response):
+        key = getattr(request, '_page_cache_key', None)
+        if key is None or getattr(response, '_from_page_cache', False):
+            return response
+        try:
+            if (
+                request.method == 'GET'
+                and response.status_code == 200
+                and not response.streaming
+                and not response.cookies
+            ):
+                set_page(key, CachedPage(
+                    response.content.decode(response.charset),
+                    response['Content-Type'],
+                    request._page_cache_version,
+                    {header: response[header] for header in CACHED_HEADERS if response.has_header(header)},
+                ))
+                response['X-Page-Cache'] = 'miss'
+        finally:
+            if getattr(request, '_page_cache_refreshing', False):
+                release_refresh(key)
+        return response
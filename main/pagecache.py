@@ -0,0 +1,82 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.http import QueryDict
+
+from apps.product.cache import bump_version, get_catalogue_version, get_version
+
+PAGE_CACHE_VERSION_KEY = 'main:page_cache_version'
+# Fresh for PAGE_CACHE_TIMEOUT seconds, then served stale for up to
+# PAGE_CACHE_STALE_TIMEOUT more while a single request regenerates it.
+PAGE_CACHE_TIMEOUT = 60 * 5
+PAGE_CACHE_STALE_TIMEOUT = 60 * 60
+PAGE_CACHE_LOCK_TIMEOUT = 30
+# URL names whose anonymous responses are cached
+CACHED_URL_NAMES = {'index', 'products', 'product_detail'}
+# Query parameters that never change the page
+IGNORED_PARAMS = {'fbclid', 'gclid'}
+
+
+def get_site_version():
+    """Version bumped by config and product variant changes"""
+    return get_version(PAGE_CACHE_VERSION_KEY)
+
+
+def get_page_cache_version():
+    """Version of everything the cached pages show: the catalogue plus site-level changes"""
+    return f'{get_catalogue_version()}.{get_site_version()}'
+
+
+def bump_page_cache_version():
+    """Mark every cached page stale (config and variant changes)"""
+    return bump_version(PAGE_CACHE_VERSION_KEY)
+
+
+def normalize_query_string(query_string):
+    """Sorted query string without blank values and tracking parameters"""
+    params = QueryDict(query_string)
+    normalized = QueryDict(mutable=True)
+    for key in sorted(params):
+        if key in IGNORED_PARAMS or key.startswith('utm_'):
+            continue
+        values = sorted(value for value in params.getlist(key) if value.strip())
+        if values:
+            normalized.setlist(key, values)
+    return normalized.urlencode()
+
+
+def page_cache_key(request):
+    url = f'{request.get_host()}{request.path}?{normalize_query_string(request.META.get("QUERY_STRING", ""))}'
+    return f'main:page:{hashlib.md5(url.encode()).hexdigest()}'
+
+
+class CachedPage:
+    """A stored response body with the version and time it was rendered at"""
+
+    def __init__(self, content, content_type, version, headers=None):
+        self.content = content
+        self.content_type = content_type
+        self.version = version
+        self.headers = headers or {}
+        self.created = time.time()
+
+    def is_fresh(self, version):
+        return self.version == version and time.time() - self.created < PAGE_CACHE_TIMEOUT
+
+
+def get_page(key):
+    return cache.get(key)
+
+
+def set_page(key, page):
+    cache.set(key, page, PAGE_CACHE_TIMEOUT + PAGE_CACHE_STALE_TIMEOUT)
+
+
+def acquire_refresh(key):
+    """True for the one request allowed to re-render a stale page"""
+    return cache.add(f'{key}:refresh', 1, PAGE_CACHE_LOCK_TIMEOUT)
+
+
+def release_refresh(key):
+    cache.delete(f'{key}:refresh')
@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.product.models import Color, Image, Size
+
+from .config import clear_config_cache
+from .models import Config
+from .pagecache import bump_page_cache_version
+
+
+@receiver([post_save, post_delete], sender=Config)
+def invalidate_config_cache(sender, **kwargs):
+    """On commit, so other processes can't re-cache the config from before it"""
+    transaction.on_commit(clear_config_cache)
+    transaction.on_commit(bump_page_cache_version)
+
+
+@receiver([post_save, post_delete], sender=Size)
+@receiver([post_save, post_delete], sender=Color)
+@receiver([post_save, post_delete], sender=Image)
+def invalidate_cached_pages(sender, raw=False, **kwargs):
+    """Product and category changes already bump the catalogue version"""
+    if raw:
+        return
+    transaction.on_commit(bump_page_cache_version)
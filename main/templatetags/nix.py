@@ -1,17 +1,23 @@
 # templatetags/ecommerce_tags.py
 
 from django import template
-from django.db.models import Count, Sum, Avg, Q
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db.models import Count, Sum, Avg
 from django.utils.safestring import mark_safe
 from django.utils.html import format_html
 from django.contrib.humanize.templatetags.humanize import intcomma
+from django.template.loader import render_to_string
 from django.urls import reverse
-from decimal import Decimal
 import json
 
-from apps.product.models import Product, Category
+from apps.product.cache import FRAGMENT_CACHE_TIMEOUT, product_fragment_key
+from apps.product.facets import get_facets
+from apps.product.models import Product
+from apps.product.related import get_related_products
 from  apps.order.models import Order
-from apps.cart.models import Cart, CartItem
+from main.config import get_config
+from main.context_processors import get_site_context
 
 register = template.Library()
 
@@ -20,20 +26,30 @@ register = template.Library()
 # INCLUSION TAGS - Render template fragments
 # =============================================================================
 
-@register.inclusion_tag('product/product_card.html')
+@register.simple_tag
 def product_card(product):
-    """Render a product card"""
-    return {
-        'product': product,
-    }
+    """Render a product card, cached until the product or its variants change"""
+    key = make_template_fragment_key('product_card', [product_fragment_key(product)])
+    html = cache.get(key)
+    if html is None:
+        html = render_to_string('product/product_card.html', {'product': product})
+        cache.set(key, html, FRAGMENT_CACHE_TIMEOUT)
+    return mark_safe(html)
 
 
-@register.inclusion_tag('ecommerce/tags/category_menu.html')
-def category_menu(current_category=None):
+def _context_facets(context):
+    """Facets computed by the current view, or the unfiltered (cached) facets"""
+    facets = context.get('facets')
+    return facets if facets is not None else get_facets()
+
+
+@register.inclusion_tag('ecommerce/tags/category_menu.html', takes_context=True)
+def category_menu(context, current_category=None):
     """Render category navigation menu"""
-    categories = Category.objects.annotate(
-        product_count=Count('products', filter=Q(products__is_active=True))
-    ).filter(product_count__gt=0)
+    categories = [
+        category for category in _context_facets(context)['categories']
+        if category.product_count > 0
+    ]
     
     return {
         'categories': categories,
@@ -45,22 +61,11 @@ def category_menu(current_category=None):
 def cart_summary(context):
     """Render cart summary widget"""
     request = context['request']
-    cart = None
-    
-    if request.user.is_authenticated:
-        cart = getattr(request.user, 'cart', None)
-    else:
-        session_id = request.session.session_key
-        if session_id:
-            cart = Cart.objects.filter(session_id=session_id).first()
-    
-    if cart:
-        total_items = cart.get_total_items()
-        total_price = cart.get_total_price()
-    else:
-        total_items = 0
-        total_price = Decimal('0.00')
-    
+    site = get_site_context(request)
+    cart = site.cart
+    total_items = site.cart_summary['total_items']
+    total_price = site.cart_summary['total_price']
+
     return {
         'cart': cart,
         'total_items': total_items,
@@ -69,25 +74,15 @@ def cart_summary(context):
     }
 
 
-@register.inclusion_tag('ecommerce/tags/product_filters.html')
-def product_filters(category=None, price_range=None, in_stock_only=False):
+@register.inclusion_tag('ecommerce/tags/product_filters.html', takes_context=True)
+def product_filters(context, category=None, price_range=None, in_stock_only=False):
     """Render product filtering options"""
-    categories = Category.objects.annotate(
-        product_count=Count('products', filter=Q(products__is_active=True))
-    )
-    
-    # Price ranges
-    price_ranges = [
-        (0, 25, "Under $25"),
-        (25, 50, "$25 - $50"),
-        (50, 100, "$50 - $100"),
-        (100, 200, "$100 - $200"),
-        (200, None, "Over $200"),
-    ]
+    facets = _context_facets(context)
     
     return {
-        'categories': categories,
-        'price_ranges': price_ranges,
+        'categories': facets['categories'],
+        'price_ranges': facets['price_ranges'],
+        'in_stock_count': facets['in_stock'],
         'current_category': category,
         'current_price_range': price_range,
         'in_stock_only': in_stock_only,
@@ -104,22 +99,18 @@ def breadcrumb(items):
 def product_gallery(product):
     """Render product image gallery"""
     images = product.get_all_images()
-    primary_image = product.get_primary_image()
     
     return {
         'product': product,
         'images': images,
-        'primary_image': primary_image,
+        'primary_image_url': product.primary_image_url,
     }
 
 
 @register.inclusion_tag('ecommerce/tags/related_products.html')
 def related_products(product, limit=4):
-    """Show related products from same category"""
-    related = Product.objects.filter(
-        category=product.category,
-        is_active=True
-    ).exclude(id=product.id)[:limit]
+    """Show products frequently bought together, or from the same category"""
+    related = get_related_products(product, limit)
     
     return {
         'products': related,
@@ -162,12 +153,28 @@ def get_featured_products(limit=8):
 
 @register.simple_tag
 def get_popular_products(limit=8):
-    """Get popular products based on order frequency"""
+    """Get popular products based on recent sales"""
+    popular = list(Product.objects.filter(
+        is_active=True,
+        stats__score__gt=0
+    ).order_by('-stats__score')[:limit])
+    if popular:
+        return popular
+    # Nothing sold yet: rank by order frequency as before the rollup
     return Product.objects.filter(is_active=True).annotate(
         order_count=Count('orderitem')
     ).order_by('-order_count')[:limit]
 
 
+@register.simple_tag
+def get_bestseller_products(limit=8):
+    """Get best selling products of all time"""
+    return Product.objects.filter(
+        is_active=True,
+        stats__units_sold__gt=0
+    ).order_by('-stats__units_sold')[:limit]
+
+
 @register.simple_tag
 def get_low_stock_products(threshold=10):
     """Get products with low stock"""
@@ -181,15 +188,7 @@ def get_low_stock_products(threshold=10):
 @register.simple_tag
 def get_cart_item_count(request):
     """Get total items in user's cart"""
-    if request.user.is_authenticated:
-        cart = getattr(request.user, 'cart', None)
-        return cart.get_total_items() if cart else 0
-    else:
-        session_id = request.session.session_key
-        if session_id:
-            cart = Cart.objects.filter(session_id=session_id).first()
-            return cart.get_total_items() if cart else 0
-    return 0
+    return get_site_context(request).cart_count
 
 
 @register.simple_tag
@@ -213,12 +212,10 @@ def calculate_savings(original_price, sale_price):
     return None
 
 
-@register.simple_tag
-def get_category_tree():
+@register.simple_tag(takes_context=True)
+def get_category_tree(context):
     """Get hierarchical category structure"""
-    return Category.objects.annotate(
-        product_count=Count('products', filter=Q(products__is_active=True))
-    ).order_by('name')
+    return _context_facets(context)['categories']
 
 
 
@@ -404,11 +401,11 @@ def set_var(context, name, value):
     return ''
 
 
-@register.simple_tag
-def config(name, default=None):
-    """Get Django setting value"""
-    from main.models import Config
-    config = Config.objects.first()
+@register.simple_tag(takes_context=True)
+def config(context, name, default=None):
+    """Get a site Config value"""
+    request = context.get('request')
+    config = get_site_context(request).config if request else get_config()
     if config:
         return getattr(config, name, default)
     return default
@@ -465,13 +462,6 @@ def if_user_can_edit(user, obj):
 @register.simple_tag
 def active_class(request, pattern):
     """Return 'active' if URL matches pattern"""
-    from django.urls import resolve
-    from django.urls.exceptions import Resolver404
-    
-    try:
-        current_url = resolve(request.path_info).url_name
-        if current_url == pattern:
-            return 'active'
-    except Resolver404:
-        pass
+    if get_site_context(request).url_name == pattern:
+        return 'active'
     return ''
\ No newline at end of file
@@ -1,3 +1,178 @@
-from django.test import TestCase
+import re
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from django.urls.resolvers import URLResolver
+
+from apps.cart.models import Cart, CartItem
+from apps.product.models import Product, Size
+
+from .config import CONFIG_CACHE_KEY, SHARED_TIMEOUT, clear_config_cache, get_config
+from .models import Config
+from .pagecache import (
+    CACHED_URL_NAMES, PAGE_CACHE_VERSION_KEY, acquire_refresh, bump_page_cache_version, get_page_cache_version,
+    page_cache_key, release_refresh,
+)
+
+
+class ConfigCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_config_cache()
+        self.config = Config.objects.create(site_title='Shop', whatsapp_number='8801700000000')
+
+    def render(self):
+        return Template(
+            "{% load nix %}{% config 'site_title' %}|{% config 'whatsapp_number' %}|{% config 'header_top' %}"
+        ).render(Context())
+
+    def test_repeated_reads_cost_no_queries(self):
+        self.render()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.render(), 'Shop|8801700000000|header top offer')
+
+    def test_save_invalidates(self):
+        self.render()
+        self.config.site_title = 'Baby & Fashion'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.config.save()
+        self.assertTrue(self.render().startswith('Baby &amp; Fashion|'))
+
+    def test_rolled_back_save_keeps_the_cache(self):
+        self.render()
+        version = get_page_cache_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.config.site_title = 'Rolled back'
+                self.config.save()
+                transaction.set_rollback(True)
+        self.assertEqual(get_page_cache_version(), version)
+        with self.assertNumQueries(0):
+            self.assertTrue(self.render().startswith('Shop|'))
+
+    def test_shared_entry_expires(self):
+        with mock.patch('main.config.cache.set') as cache_set:
+            get_config()
+        cache_set.assert_called_once_with(CONFIG_CACHE_KEY, self.config, SHARED_TIMEOUT)
+
+
+class SiteContextTest(TestCase):
+    """Query and URL-resolver budgets for pages that render the full layout"""
+
+    def setUp(self):
+        cache.clear()
+        clear_config_cache()
+        Config.objects.create(site_title='Shop')
+        self.product = Product.objects.create(
+            name='Rattle', price='15.00', sku='RATTLE-1', stock_quantity=5, is_featured=True
+        )
+
+    def get(self, url):
+        resolve = URLResolver.resolve
+        calls = []
+
+        def counting_resolve(resolver, path):
+            if resolver.urlconf_name == settings.ROOT_URLCONF:
+                calls.append(path)
+            return resolve(resolver, path)
+
+        with mock.patch.object(URLResolver, 'resolve', counting_resolve):
+            response = self.client.get(url, secure=True)
+        return response, len(calls)
+
+    def test_index_budget(self):
+        get_config()
+        # featured products only; config is served from cache
+        with self.assertNumQueries(1):
+            response, resolver_calls = self.get('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(resolver_calls, 1)
+
+    def test_cart_summary_is_computed_once(self):
+        session = self.client.session
+        session['seen'] = True
+        session.save()
+        cart = Cart.objects.create(session_id=session.session_key)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=3)
+        self.get('/')
+        # session and featured products; the first request stored the cart summary cookie
+        with self.assertNumQueries(2):
+            response, resolver_calls = self.get('/')
+        self.assertContains(response, 'cartCount: 3')
+        self.assertEqual(resolver_calls, 1)
+
+
+class AnonymousPageCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_config_cache()
+        Config.objects.create(site_title='Shop')
+        self.product = Product.objects.create(
+            name='Blanket', price='30.00', sku='BLANKET-1', stock_quantity=5, is_featured=True
+        )
+        self.url = self.product.get_absolute_url()
+
+    def test_second_request_is_served_from_cache(self):
+        self.assertEqual(self.client.get(self.url, secure=True)['X-Page-Cache'], 'miss')
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, secure=True)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'Blanket')
+
+    def test_cached_url_names_exist(self):
+        for name in CACHED_URL_NAMES:
+            reverse(name, args=[self.product.slug] if name == 'product_detail' else [])
+
+    def test_bump_never_repeats_a_version(self):
+        first = get_page_cache_version()
+        bump_page_cache_version()
+        second = get_page_cache_version()
+        cache.delete(PAGE_CACHE_VERSION_KEY)
+        self.assertNotIn(get_page_cache_version(), (first, second))
+
+    def test_query_string_is_normalized(self):
+        self.client.get('/product/?sort=price&q=&utm_source=mail', secure=True)
+        response = self.client.get('/product/?sort=price', secure=True)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+
+    def test_cached_form_gets_visitor_csrf_token(self):
+        self.client.get(self.url, secure=True)
+        client = self.client_class(enforce_csrf_checks=True)
+        response = client.get(self.url, secure=True)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', response.content.decode()).group(1)
+        response = client.post(
+            '/cart/add/', {'product_id': self.product.pk, 'quantity': 1, 'csrfmiddlewaretoken': token},
+            secure=True, HTTP_REFERER='https://testserver/',
+        )
+        self.assertEqual(response.status_code, 302)
+
+    def test_bypassed_for_non_empty_cart(self):
+        self.client.get(self.url, secure=True)
+        self.client.post('/cart/add/', {'product_id': self.product.pk, 'quantity': 1}, secure=True)
+        response = self.client.get(self.url, secure=True)
+        self.assertFalse(response.has_header('X-Page-Cache'))
+
+    def test_edit_serves_stale_while_one_request_refreshes(self):
+        self.client.get(self.url, secure=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            Size.objects.create(product=self.product, name='XXL')
+
+        # Another request holds the refresh lock: serve the stale page
+        key = page_cache_key(RequestFactory().get(self.url, secure=True))
+        self.assertTrue(acquire_refresh(key))
+        response = self.client.get(self.url, secure=True)
+        self.assertEqual(response['X-Page-Cache'], 'stale')
+        self.assertNotContains(response, 'Select size XXL')
+
+        release_refresh(key)
+        response = self.client.get(self.url, secure=True)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Select size XXL')
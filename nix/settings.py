@@ -64,6 +64,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'apps.cart.middleware.CartSummaryMiddleware',
+    'main.middleware.AnonymousPageCacheMiddleware',
 ]
 
 SECURE_HSTS_SECONDS = 31536000  
@@ -83,6 +85,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'main.context_processors.site',
             ],
         },
     },
@@ -104,6 +107,26 @@ DATABASES = {
     }
 }
 
+# Version counters, cached pages, config and counts must be shared by every
+# worker, so production needs REDIS_URL. The local-memory fallback is per
+# process and only fit for development and tests (see main.checks).
+REDIS_URL = getenv('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -141,3 +164,6 @@ cloudinary.config(
 )
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Callable returning a new order number, see apps.order.numbers
+ORDER_NUMBER_GENERATOR = 'apps.order.numbers.time_ordered_number'